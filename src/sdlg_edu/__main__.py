@@ -0,0 +1,6 @@
+import sys
+
+from sdlg_edu.cli import main
+
+if __name__ == "__main__":  # spawn 方式のワーカーが __mp_main__ として読み直したときは実行しない
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Reproducible throughput benchmark for the Makefile pipeline (generate → quality → export → package).
+
+    python src/sdlg_edu/bench.py --scales 10000,100000,1000000 --out reports/bench.json
+    python src/sdlg_edu/bench.py --scales 10000 --compare reports/bench_baseline.json --threshold 0.15
+    python src/sdlg_edu/bench.py --compare reports/bench_baseline.json --against reports/bench.json
+
+規模ごとに以下の段階を別プロセスで実行し、壁時計時間・ピーク RSS（子プロセスの ru_maxrss）・items/s を測る。
+- synth   : recipe の各行から build_items で N 件を作る（dedup なし）。後段の入力コーパスになる
+- generate: run_generate.py 本体（5-gram dedup あり）。既定は --sampler slots で N 件を要求する。
+            レシピが飽和すると N 件に届かないので items は実際に書けた行数
+- quality : run_quality.py（合成コーパスは dup ゲートに落ちるので終了コード 2 も成功扱い）
+- export  : export_csv.py
+- package : make_package.py
+startup は sdlg-edu の各サブコマンドについて、-X importtime で測ったモジュールの import 時間（累積 µs）と
+`python -m sdlg_edu <command> -h` の壁時計時間を --startup-runs 回測って最小値を記録する。
+--compare は同じ (scale, stage) の wall_s / max_rss_kb と、startup の import_us / wall_s をベースラインと比べ、
+threshold を超えて悪化したものを列挙して終了コード 1 を返す。
+"""
+
+from __future__ import annotations
+import os, sys
+if not __package__:  # python src/sdlg_edu/bench.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+from sdlg_edu import fileio
+from sdlg_edu.cli import COMMANDS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.dirname(HERE)
+ROOT = os.path.dirname(SRC)
+STAGES = ("synth", "generate", "quality", "export", "package")
+DEFAULT_SCALES = "10000,100000,1000000"
+SYNTH_BATCH = 1000
+
+def synthesize(recipe_path: str, n: int, out_path: str, seed: int = 42) -> int:
+    """recipe の行を順に回して合計 n 件（行ごとにほぼ等分）を out_path に書く。書いた件数を返す。"""
+    from sdlg_edu.run_generate import build_items, load_recipe
+    recipe = load_recipe(recipe_path)
+    r = random.Random(seed)
+    idx = 1
+    with fileio.JsonlWriter(out_path, "w", "none") as wf:
+        for i, spec in enumerate(recipe):
+            quota = n // len(recipe) + (1 if i < n % len(recipe) else 0)
+            while quota > 0:
+                k = min(SYNTH_BATCH, quota)
+                for item in build_items(r, idx, spec["topic"], spec["pattern"], k):
+                    wf.write(item)
+                idx += k
+                quota -= k
+    return idx - 1
+
+def run_stage(cmd: List[str], ok_codes=(0,)) -> Dict:
+    """cmd を子プロセスで実行し、壁時計時間とその子のピーク RSS（KiB、取れなければ None）を返す。"""
+    t0 = time.perf_counter()
+    p = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                         env=dict(os.environ, PYTHONHASHSEED="0"))
+    if hasattr(os, "wait4"):
+        # stderr を読み切ってから wait4（パイプ詰まりを避ける）。rusage はこの子プロセス単体のもの
+        err = p.stderr.read()
+        _, status, ru = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status)
+        rss = ru.ru_maxrss // 1024 if sys.platform == "darwin" else ru.ru_maxrss  # macOS はバイト
+    else:
+        _, err = p.communicate()
+        rss = None
+    wall = time.perf_counter() - t0
+    if p.returncode not in ok_codes:
+        raise RuntimeError(f"stage failed ({p.returncode}): {' '.join(cmd)}\n{err.decode('utf-8', 'replace')}")
+    return {"wall_s": round(wall, 4), "max_rss_kb": rss}
+
+def _count_lines(path: str) -> int:
+    n = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            n += block.count(b"\n")
+    return n
+
+def bench_scale(n: int, workdir: str, recipe: str, seed: int, gen_sampler: str = "slots",
+                gen_n_per_topic: int = 0, stages=STAGES) -> Dict[str, Dict]:
+    py = sys.executable
+    if not gen_n_per_topic:
+        with open(recipe, encoding="utf-8") as f:
+            lines = sum(1 for line in f if line.strip())
+        gen_n_per_topic = -(-n // max(1, lines))
+    d = os.path.join(workdir, str(n))
+    os.makedirs(d, exist_ok=True)
+    corpus = os.path.join(d, "corpus.jsonl")
+    csv_path = os.path.join(d, "corpus.csv")
+    qjson = os.path.join(d, "quality.json")
+    script = lambda name: os.path.join(HERE, name)
+    plan = {
+        "synth": ([py, script("bench.py"), "--synth", str(n), "--synth-out", corpus,
+                   "--recipe", recipe, "--seed", str(seed)], (0,)),
+        "generate": ([py, script("run_generate.py"), "--recipe", recipe, "--seed", str(seed), "--deterministic",
+                      "--outdir", os.path.join(d, "gen"), "--n-per-topic", str(gen_n_per_topic),
+                      "--sampler", gen_sampler], (0,)),
+        "quality": ([py, script("run_quality.py"), "--input", corpus, "--out_json", qjson,
+                     "--out_md", os.path.join(d, "quality_summary.md")], (0, 2)),
+        "export": ([py, script("export_csv.py"), "--input", corpus, "--out", csv_path], (0,)),
+        "package": ([py, script("make_package.py"), "--data", csv_path, "--report", qjson,
+                     "--readme", os.path.join(ROOT, "docs", "EN_GRAMMAR_README.md"),
+                     "--out", os.path.join(d, "package.zip")], (0,)),
+    }
+    out = {}
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        cmd, ok = plan[stage]
+        res = run_stage(cmd, ok)
+        if stage == "generate":
+            items = _count_lines(os.path.join(d, "gen", "english_grammar_qa.jsonl"))
+        else:
+            items = n
+        res["items"] = items
+        res["items_per_s"] = round(items / res["wall_s"], 1) if res["wall_s"] else 0.0
+        out[stage] = res
+        print(f"[{n}] {stage:<8} {res['wall_s']:>9.3f}s  {res['items_per_s']:>12,.1f} items/s"
+              f"  rss {res['max_rss_kb'] or '-'} KiB")
+    return out
+
+def _src_env() -> Dict[str, str]:
+    path = os.environ.get("PYTHONPATH")
+    return dict(os.environ, PYTHONHASHSEED="0", PYTHONPATH=SRC + (os.pathsep + path if path else ""))
+
+def parse_importtime(stderr: str) -> Dict[str, List[int]]:
+    """-X importtime の出力 → モジュール名 → [self µs, cumulative µs]（同名が複数回出たら最初のもの）。"""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 見出し行
+        out.setdefault(parts[2].strip(), [int(parts[0]), int(parts[1])])
+    return out
+
+def measure_startup(runs: int = 5, top: int = 5) -> Dict[str, Dict]:
+    """サブコマンドごとに import 時間（-X importtime の累積 µs）と -h の起動時間の最小値、重い import 上位を返す。"""
+    py = sys.executable
+    env = _src_env()
+    # インタプリタ起動時に読まれるもの（site など）は重い import の一覧から除く
+    startup = parse_importtime(subprocess.run([py, "-X", "importtime", "-c", "pass"], cwd=ROOT, env=env,
+                                              capture_output=True, text=True, check=True).stderr)
+    out = {}
+    for name, (module, _) in COMMANDS.items():
+        best_us, best_wall, heavy = None, None, []
+        for _ in range(runs):
+            p = subprocess.run([py, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+            times = parse_importtime(p.stderr)
+            us = times[module][1]
+            if best_us is None or us < best_us:
+                best_us = us
+                heavy = sorted(((m, t[1]) for m, t in times.items() if m != module and m not in startup),
+                               key=lambda kv: kv[1], reverse=True)[:top]
+            t0 = time.perf_counter()
+            subprocess.run([py, "-m", "sdlg_edu", name, "-h"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                           check=True)
+            wall = time.perf_counter() - t0
+            best_wall = wall if best_wall is None else min(best_wall, wall)
+        out[name] = {"module": module, "import_us": best_us, "wall_s": round(best_wall, 4),
+                     "heaviest": [{"module": m, "cumulative_us": us} for m, us in heavy]}
+        print(f"[startup] {name:<9} import {best_us / 1000:>8.1f} ms  -h {best_wall * 1000:>8.1f} ms")
+    return out
+
+def compare(base: Dict, new: Dict, threshold: float) -> List[str]:
+    """threshold（0.1 = 10%）を超えて遅く/重くなった (scale, stage, 指標) を返す。"""
+    regressions = []
+    for name, res in new.get("startup", {}).items():
+        ref = base.get("startup", {}).get(name)
+        if not ref:
+            continue
+        for key in ("import_us", "wall_s"):
+            a, b = ref.get(key), res.get(key)
+            if a and b and b > a * (1 + threshold):
+                regressions.append(f"startup {name} {key}: {a} -> {b} (+{(b / a - 1) * 100:.1f}%)")
+    for scale, stages in new.get("results", {}).items():
+        for stage, res in stages.items():
+            ref = base.get("results", {}).get(scale, {}).get(stage)
+            if not ref:
+                continue
+            for key in ("wall_s", "max_rss_kb"):
+                a, b = ref.get(key), res.get(key)
+                if a and b and b > a * (1 + threshold):
+                    regressions.append(f"{scale} {stage} {key}: {a} -> {b} (+{(b / a - 1) * 100:.1f}%)")
+    return regressions
+
+def _git_head() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default=DEFAULT_SCALES, help="Comma-separated corpus sizes")
+    ap.add_argument("--stages", default=",".join(STAGES), help=f"Subset of {','.join(STAGES)}")
+    ap.add_argument("--recipe", default=os.path.join(ROOT, "recipes", "grammar.jsonl"))
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--gen-sampler", default="slots",
+                    help="--sampler for the generate stage (retry rebuilds up to 36x per item and is much slower)")
+    ap.add_argument("--gen-n-per-topic", type=int, default=0,
+                    help="--n-per-topic for the generate stage (0 = scale / recipe lines)")
+    ap.add_argument("--workdir", default=os.path.join(ROOT, "outputs", "bench"))
+    ap.add_argument("--out", default=os.path.join(ROOT, "reports", "bench.json"))
+    ap.add_argument("--compare", help="Baseline JSON to compare against")
+    ap.add_argument("--against", help="With --compare: compare this existing result file instead of running")
+    ap.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown ratio before flagging (0.10 = 10%%)")
+    ap.add_argument("--startup-runs", type=int, default=5,
+                    help="Measure import time / startup of each sdlg-edu command N times and keep the minimum (0 = skip)")
+    ap.add_argument("--synth", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--synth-out", help=argparse.SUPPRESS)
+    a = ap.parse_args()
+
+    if a.synth is not None:
+        # bench_scale から子プロセスとして呼ばれる synth 段階
+        synthesize(a.recipe, a.synth, a.synth_out, a.seed)
+        return
+
+    if a.against:
+        if not a.compare:
+            ap.error("--against needs --compare")
+        with open(a.against, encoding="utf-8") as f:
+            result = json.load(f)
+    else:
+        stages = [s for s in a.stages.split(",") if s]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            ap.error(f"unknown stages: {', '.join(sorted(unknown))}")
+        result = {
+            "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "commit": _git_head(), "seed": a.seed, "recipe": os.path.relpath(a.recipe, ROOT),
+                     "gen_sampler": a.gen_sampler, "gen_n_per_topic": a.gen_n_per_topic},
+            "results": {},
+        }
+        if a.startup_runs > 0:
+            result["startup"] = measure_startup(a.startup_runs)
+        for n in [int(s) for s in a.scales.split(",") if s]:
+            result["results"][str(n)] = bench_scale(n, a.workdir, a.recipe, a.seed, a.gen_sampler,
+                                                  a.gen_n_per_topic, stages)
+        os.makedirs(os.path.dirname(os.path.abspath(a.out)), exist_ok=True)
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Saved: {a.out}")
+
+    if a.compare:
+        with open(a.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        regressions = compare(base, result, a.threshold)
+        for line in regressions:
+            print(f"[regression] {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions beyond {a.threshold:.0%} vs {a.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Single console entry point for the sdlg_edu tools.
+
+    sdlg-edu generate --recipe recipes/grammar.jsonl --seed 42 --deterministic --outdir outputs
+    sdlg-edu quality --input outputs/english_grammar_qa.jsonl --out_json reports/quality.json --out_md reports/quality_summary.md
+    python -m sdlg_edu export --input outputs/english_grammar_qa.jsonl --out outputs/english_grammar_qa.csv
+
+サブコマンドのモジュールは使うときにだけ import する（このファイル自体は標準ライブラリの importlib だけ）。
+引数はそのままサブコマンドの main() に渡すので、オプションは各スクリプトを直接実行したときと同じ。
+"""
+
+from __future__ import annotations
+import importlib
+import sys
+from typing import List, Optional
+
+# サブコマンド → (モジュール, 説明)
+COMMANDS = {
+    "generate":   ("sdlg_edu.run_generate", "Generate the grammar QA JSONL from a recipe"),
+    "quality":    ("sdlg_edu.run_quality", "Compute quality metrics and apply the release gate"),
+    "export":     ("sdlg_edu.export_csv", "Export the JSONL to CSV (or the columnar format)"),
+    "package":    ("sdlg_edu.make_package", "Build the release zip with MANIFEST.json"),
+    "pipeline":   ("sdlg_edu.pipeline", "generate -> quality -> export -> package in one streaming pass"),
+    "index":      ("sdlg_edu.record_index", "Build or query the random-access record index"),
+    "spot-check": ("sdlg_edu.spot_check", "Draw the stratified human-review sample as a markdown table"),
+    "bench":      ("sdlg_edu.bench", "Throughput / RSS / import-time benchmark"),
+}
+
+def usage() -> str:
+    lines = ["usage: sdlg-edu <command> [options]", "", "commands:"]
+    for name, (_, help_) in COMMANDS.items():
+        lines.append(f"  {name:<11} {help_}")
+    lines += ["", "Run 'sdlg-edu <command> -h' for the options of each command."]
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage(), file=sys.stdout if argv else sys.stderr)
+        return 0 if argv else 2
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"sdlg-edu: unknown command {name!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(COMMANDS[name][0])
+    # 各 main() は argparse で sys.argv を読む（prog 表示もサブコマンド名になる）
+    sys.argv = [f"sdlg-edu {name}", *rest]
+    module.main()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Compact, self-describing columnar file format for exported datasets.
+
+Layout (little-endian):
+    b"SDLGCOL1"
+    column sections (8-byte aligned)
+    footer JSON (utf-8)
+    footer length (uint64)
+    b"SDLGCOL1"
+
+Footer:
+    {"version": 1, "rows": N, "columns": [
+        {"name": "topic", "encoding": "dict", "dictionary": [...],
+         "codes": {"offset": o, "length": l, "dtype": "<u4"}},
+        {"name": "question_en", "encoding": "plain",
+         "offsets": {"offset": o, "length": l, "dtype": "<u8"},   # N+1 個、data 内の utf-8 バイト位置
+         "data": {"offset": o, "length": l}},
+    ]}
+
+読むのは標準ライブラリ（ColumnarReader.column）だけで足り、NumPy があれば
+ColumnarReader.numpy_column で codes / offsets を np.memmap のまま扱える。
+必要な列のセクションだけを読むので、2〜3列しか使わないローダーは残りを読み飛ばせる。
+"""
+
+from __future__ import annotations
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+MAGIC = b"SDLGCOL1"
+VERSION = 1
+DEFAULT_DICT_COLUMNS = ("topic", "difficulty", "source")
+_FLUSH_EVERY = 1 << 16
+
+def le_bytes(arr: array) -> bytes:
+    """array をリトルエンディアンのバイト列にする（ファイル上の整数列はすべてこの形式。record_index も使う）。"""
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+class _PlainColumn:
+    def __init__(self, name: str, tmpdir: Optional[str]):
+        self.name = name
+        self.data = tempfile.TemporaryFile(dir=tmpdir)
+        self.offsets = tempfile.TemporaryFile(dir=tmpdir)
+        self._pos = 0
+        self._buf = array("Q", [0])
+
+    def add(self, value: str) -> None:
+        b = value.encode("utf-8")
+        self.data.write(b)
+        self._pos += len(b)
+        self._buf.append(self._pos)
+        if len(self._buf) >= _FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        self.offsets.write(le_bytes(self._buf))
+        self._buf = array("Q")
+
+class _DictColumn:
+    def __init__(self, name: str, tmpdir: Optional[str]):
+        self.name = name
+        self.codes = tempfile.TemporaryFile(dir=tmpdir)
+        self.dictionary: Dict[str, int] = {}
+        self._buf = array("I")
+
+    def add(self, value: str) -> None:
+        code = self.dictionary.get(value)
+        if code is None:
+            code = self.dictionary[value] = len(self.dictionary)
+        self._buf.append(code)
+        if len(self._buf) >= _FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        self.codes.write(le_bytes(self._buf))
+        self._buf = array("I")
+
+class ColumnarWriter:
+    """
+    行を writerow() で1行ずつ受け取り、列ごとに一時ファイルへ逐次書き出す（行をメモリに溜めない）。
+    close() で各列のセクションを <path>.tmp にまとめてフッタを付け、書き終えてから path へ rename する。
+    with の中で例外が出たときは何も書かない（途中までの行だけの、見た目は正しいファイルを残さない）。
+    """
+
+    def __init__(self, path: str, columns: Sequence[str], dict_columns: Iterable[str] = DEFAULT_DICT_COLUMNS):
+        self.path = path
+        self.columns = list(columns)
+        self.count = 0
+        tmpdir = os.path.dirname(os.path.abspath(path))
+        dict_columns = set(dict_columns)
+        self._cols = [_DictColumn(c, tmpdir) if c in dict_columns else _PlainColumn(c, tmpdir)
+                      for c in self.columns]
+        self._closed = False
+
+    def writerow(self, row: Sequence) -> None:
+        # fileio.CsvWriter と同じ呼び方で使えるようにしておく
+        for col, value in zip(self._cols, row):
+            col.add("" if value is None else str(value))
+        self.count += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.abort()
+
+    def abort(self) -> None:
+        """一時ファイルを捨てて終わる（path には何も書かない）。"""
+        if self._closed:
+            return
+        self._closed = True
+        for col in self._cols:
+            for f in (col.codes,) if isinstance(col, _DictColumn) else (col.data, col.offsets):
+                f.close()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            self._write(tmp)
+        except BaseException:
+            self.abort()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._closed = True
+        os.replace(tmp, self.path)
+
+    def _write(self, tmp: str) -> None:
+        meta = []
+        with open(tmp, "wb") as out:
+            out.write(MAGIC)
+
+            def section(src, **extra):
+                # 8 byte 境界にそろえて一時ファイルの中身をコピー
+                pad = (-out.tell()) % 8
+                out.write(b"\0" * pad)
+                offset = out.tell()
+                src.seek(0)
+                shutil.copyfileobj(src, out, 1 << 20)
+                src.close()
+                return {"offset": offset, "length": out.tell() - offset, **extra}
+
+            for col in self._cols:
+                col.flush()
+                if isinstance(col, _DictColumn):
+                    values = [None] * len(col.dictionary)
+                    for v, code in col.dictionary.items():
+                        values[code] = v
+                    meta.append({"name": col.name, "encoding": "dict", "dictionary": values,
+                                 "codes": section(col.codes, dtype="<u4")})
+                else:
+                    meta.append({"name": col.name, "encoding": "plain",
+                                 "offsets": section(col.offsets, dtype="<u8"),
+                                 "data": section(col.data)})
+            footer = json.dumps({"version": VERSION, "rows": self.count, "columns": meta},
+                                ensure_ascii=False).encode("utf-8")
+            out.write(footer)
+            out.write(struct.pack("<Q", len(footer)))
+            out.write(MAGIC)
+
+class ColumnarReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"not a sdlg columnar file: {path}")
+            f.seek(-(len(MAGIC) + 8), os.SEEK_END)
+            (footer_len,) = struct.unpack("<Q", f.read(8))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"truncated sdlg columnar file: {path}")
+            f.seek(-(len(MAGIC) + 8 + footer_len), os.SEEK_END)
+            self.meta = json.loads(f.read(footer_len).decode("utf-8"))
+        self.rows: int = self.meta["rows"]
+        self._cols = {c["name"]: c for c in self.meta["columns"]}
+
+    @property
+    def columns(self) -> List[str]:
+        return [c["name"] for c in self.meta["columns"]]
+
+    def _read(self, sec) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(sec["offset"])
+            return f.read(sec["length"])
+
+    def _array(self, sec, typecode: str) -> array:
+        arr = array(typecode)
+        arr.frombytes(self._read(sec))
+        if sys.byteorder == "big":
+            arr.byteswap()
+        return arr
+
+    def column(self, name: str) -> List[str]:
+        """1列を str のリストで返す（標準ライブラリのみ）。"""
+        c = self._cols[name]
+        if c["encoding"] == "dict":
+            values = c["dictionary"]
+            return [values[code] for code in self._array(c["codes"], "I")]
+        offsets = self._array(c["offsets"], "Q")
+        data = self._read(c["data"])
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self.rows)]
+
+    def numpy_column(self, name: str):
+        """
+        NumPy 版。dict 列は (codes: np.memmap[uint32], dictionary: list)、
+        plain 列は (offsets: np.memmap[uint64], data: np.memmap[uint8]) を返す。
+        """
+        import numpy as np
+        c = self._cols[name]
+        if c["encoding"] == "dict":
+            codes = np.memmap(self.path, dtype="<u4", mode="r", offset=c["codes"]["offset"],
+                              shape=(self.rows,)) if self.rows else np.zeros(0, "<u4")
+            return codes, c["dictionary"]
+        offsets = np.memmap(self.path, dtype="<u8", mode="r", offset=c["offsets"]["offset"],
+                            shape=(self.rows + 1,))
+        data = np.memmap(self.path, dtype=np.uint8, mode="r", offset=c["data"]["offset"],
+                         shape=(c["data"]["length"],)) if c["data"]["length"] else np.zeros(0, np.uint8)
+        return offsets, data
+
+    def iter_rows(self, columns: Optional[Sequence[str]] = None):
+        columns = list(columns or self.columns)
+        return zip(*(self.column(c) for c in columns))
@@ -1,25 +1,62 @@
-import argparse, csv, json
+import os, sys
+if not __package__:  # python src/sdlg_edu/export_csv.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse
+
+from sdlg_edu import fileio, instrument as inst
+from sdlg_edu.columnar import DEFAULT_DICT_COLUMNS, ColumnarWriter
 
 COLUMNS = ["id","topic","question_en","answer_en","explanation_ja","difficulty","source"]
+FORMATS = ("csv", "columnar")
+
+def to_row(obj):
+    return [obj.get(k,"") for k in COLUMNS]
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--format", choices=FORMATS, default="csv",
+                    help="csv, or columnar (sdlg_edu.columnar: per-column sections, dictionary-encoded low-cardinality fields)")
+    ap.add_argument("--dict-columns", default=",".join(DEFAULT_DICT_COLUMNS),
+                    help="Comma-separated columns to dictionary-encode in --format columnar")
+    fileio.add_output_args(ap, default_compression=None)
+    inst.add_metrics_args(ap)
     a = ap.parse_args()
+    if a.format == "columnar":
+        # columnar は mmap で読むので圧縮できず、書き込みも close() でまとめて行う（行バッチ・fsync の出番がない）
+        ignored = [opt for opt, given in (
+            # --compress 省略時に拡張子 (.gz など) で圧縮を指定した場合も同じ扱い
+            ("--compress", (a.compress or fileio.compression_from_path(a.out)) != "none"),
+            ("--write-batch", a.write_batch != fileio.DEFAULT_BATCH_SIZE),
+            ("--buffer-size", a.buffer_size != fileio.DEFAULT_BUFFER_SIZE),
+            ("--fsync", a.fsync != "never"),
+        ) if given]
+        if ignored:
+            ap.error(f"{', '.join(ignored)} cannot be used with --format columnar")
+    stats = inst.setup("export", a)
 
-    rows = []
-    with open(a.input, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip(): continue
-            obj = json.loads(line)
-            rows.append([obj.get(k,"") for k in COLUMNS])
-
-    with open(a.out, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(COLUMNS)
-        w.writerows(rows)
-    print(f"Wrote CSV -> {a.out}  ({len(rows)} rows)")
+    # 読みながら書く（全行をメモリに載せない）。--compress 省略時は --out の拡張子で判定
+    if a.format == "columnar":
+        dict_columns = [c for c in a.dict_columns.split(",") if c]
+        w = ColumnarWriter(a.out, COLUMNS, dict_columns)
+    else:
+        w = fileio.CsvWriter(a.out, COLUMNS, a.compress, **fileio.output_kwargs(a))
+    with w:
+        # 必要な列だけを射影した行リストをチャンク単位で受け取る
+        rows = fileio.iter_jsonl_batches(a.input, fields=COLUMNS)
+        while True:
+            with stats.timer("parse"):
+                batch = next(rows, None)
+            if batch is None:
+                break
+            with stats.timer("write"):
+                for row in batch:
+                    w.writerow(row)
+            stats.tick(len(batch))
+    label = "CSV" if a.format == "csv" else "columnar"
+    print(f"Wrote {label} -> {a.out}  ({w.count} rows)")
+    inst.finish(a)
 
 if __name__ == "__main__":
     main()
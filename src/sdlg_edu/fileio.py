@@ -0,0 +1,320 @@
+"""
+Shared file I/O layer for the sdlg_edu tools.
+
+- 拡張子（.gz / .bz2 / .xz / .zst）または明示指定でストリーミング圧縮を透過的に扱う（標準ライブラリのみ。
+  zstd は Python 3.14 の compression.zstd がある場合だけ）
+- JsonlWriter / CsvWriter はレコードをバッチでまとめてシリアライズ・書き出しし、
+  バッファサイズと fsync ポリシー（never / batch / close）を選べる
+- iter_jsonl / iter_jsonl_batches は大きなチャンクで読み、チャンク内の行を1つの JSON 配列として
+  まとめてデコードする（行ごとの strip・decode・json.loads 呼び出しをしない）。fields を渡すと
+  そのフィールドだけのリストを返す射影モード
+"""
+
+from __future__ import annotations
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+COMPRESSIONS = ("none", "gzip", "bz2", "xz", "zstd")
+FSYNC_POLICIES = ("never", "batch", "close")
+SUFFIXES = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_READ_CHUNK = 4 << 20
+
+def compression_from_path(path: str) -> str:
+    for kind, suffix in SUFFIXES.items():
+        if path.endswith(suffix):
+            return kind
+    return "none"
+
+def with_compression_suffix(path: str, compression: str) -> str:
+    suffix = SUFFIXES.get(compression or "none", "")
+    return path if not suffix or path.endswith(suffix) else path + suffix
+
+def open_binary(path: str, mode: str = "rb", compression: Optional[str] = None,
+                buffer_size: int = DEFAULT_BUFFER_SIZE):
+    """mode は rb / wb / ab。compression 省略時は拡張子から判定する。"""
+    compression = compression or compression_from_path(path)
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"unknown compression: {compression!r}")
+    if compression == "zstd":
+        try:
+            from compression import zstd  # Python 3.14+
+        except ImportError:
+            raise RuntimeError("zstd compression needs Python 3.14+ (compression.zstd)")
+    if compression == "none":
+        return open(path, mode, buffering=buffer_size)
+    raw = open(path, mode, buffering=buffer_size)
+    if compression == "gzip":
+        # ファイル名・時刻をヘッダに入れない（同じ入力なら同じバイト列）
+        return _Owning(gzip.GzipFile(fileobj=raw, mode=mode, filename="", mtime=0), raw)
+    if compression == "bz2":
+        return _Owning(bz2.BZ2File(raw, mode), raw)
+    if compression == "xz":
+        return _Owning(lzma.LZMAFile(raw, mode), raw)
+    return _Owning(zstd.ZstdFile(raw, mode), raw)
+
+def open_text(path: str, mode: str = "r", compression: Optional[str] = None,
+              buffer_size: int = DEFAULT_BUFFER_SIZE, newline: Optional[str] = None):
+    """UTF-8 テキストとして開く（mode は r / w / a）。"""
+    f = open_binary(path, mode[0] + "b", compression, buffer_size)
+    return io.TextIOWrapper(f, encoding="utf-8", newline=newline)
+
+def split_line_ranges(path: str, n: int):
+    """ファイルを行境界にそろえた n 個以下のバイト範囲 [(start, end), ...] に分割する。"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, n):
+            pos = size * i // n
+            if pos <= bounds[-1]:
+                continue
+            f.seek(pos - 1)
+            f.readline()  # pos-1 を含む行の終わりまで進める → 次の行頭
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def _line_chunks(f, remaining: Optional[int], chunk_size: int, pos: int = 0):
+    # 行の途中で切らないチャンク（末尾は改行）ごとに (先頭行のバイト位置, 行のリスト) を返す
+    tail = b""
+    while remaining is None or remaining > 0:
+        buf = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not buf:
+            break
+        if remaining is not None:
+            remaining -= len(buf)
+        cut = buf.rfind(b"\n") + 1
+        if not cut:
+            tail += buf
+            continue
+        block = tail + buf[:cut]
+        tail = buf[cut:]
+        yield pos, block.split(b"\n")
+        pos += len(block)
+    if tail:
+        yield pos, [tail]
+
+def _line_offsets(pos: int, lines: List[bytes]) -> List[int]:
+    # _decode_lines が残す行（空行以外）の先頭バイト位置
+    out = []
+    for l in lines:
+        if l and not l.isspace():
+            out.append(pos)
+        pos += len(l) + 1
+    return out
+
+def _decode_lines(lines: List[bytes]) -> List:
+    lines = [l for l in lines if l and not l.isspace()]
+    if not lines:
+        return []
+    try:
+        # json.loads(bytes) は行ごとに文字コード判定が入るので、まとめて str にしてから
+        records = json.loads((b"[" + b",".join(lines) + b"]").decode("utf-8"))
+        if len(records) == len(lines):
+            return records
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        pass
+    # 壊れた行（"1,2" のように配列の中でだけ通るものも含む）があれば1行ずつデコードし直して、
+    # その行で従来と同じ例外を出す
+    return [json.loads(l.decode("utf-8")) for l in lines]
+
+def iter_jsonl_batches(path: str, fields: Optional[Sequence[str]] = None, start: int = 0, end: Optional[int] = None,
+                       chunk_size: int = DEFAULT_READ_CHUNK, default="", offsets: bool = False) -> Iterable[List]:
+    """
+    JSONL をチャンク単位でデコードしたレコードのリストを順に返す（空行は飛ばす）。
+    start / end を渡すとそのバイト範囲（非圧縮ファイルのみ。start は行頭）だけを読む。
+    fields を渡すと各レコードは [obj.get(f, default) for f in fields] のリストになる。
+    offsets=True なら各要素は (行頭のバイト位置, レコード)。圧縮ファイルでは展開後のストリーム上の位置。
+    """
+    ranged = start or end is not None
+    f = open(path, "rb", buffering=0) if ranged else open_binary(path, "rb")
+    with f:
+        if start:
+            f.seek(start)
+        for pos, lines in _line_chunks(f, None if end is None else end - start, chunk_size, start):
+            records = _decode_lines(lines)
+            if fields is not None:
+                records = [[o.get(k, default) for k in fields] for o in records]
+            if offsets:
+                records = list(zip(_line_offsets(pos, lines), records))
+            if records:
+                yield records
+
+def iter_jsonl(path: str, fields: Optional[Sequence[str]] = None, start: int = 0, end: Optional[int] = None,
+               chunk_size: int = DEFAULT_READ_CHUNK, default="", offsets: bool = False) -> Iterable:
+    for records in iter_jsonl_batches(path, fields, start, end, chunk_size, default, offsets):
+        yield from records
+
+class _Owning(io.BufferedIOBase):
+    # 圧縮ストリームを閉じるときに下の生ファイルも閉じる（gzip 等は fileobj を閉じないため）
+    def __init__(self, stream, raw):
+        self._stream = stream
+        self._raw = raw
+
+    def readable(self): return self._stream.readable()
+    def writable(self): return self._stream.writable()
+    def read(self, n=-1): return self._stream.read(n)
+    def read1(self, n=-1): return self._stream.read1(n)
+    def readinto(self, b): return self._stream.readinto(b)
+    def readline(self, limit=-1): return self._stream.readline(limit)
+    def write(self, b): return self._stream.write(b)
+    def flush(self): self._stream.flush(); self._raw.flush()
+    def fileno(self): return self._raw.fileno()
+    def __iter__(self): return iter(self._stream)
+
+    def close(self):
+        if not self.closed:
+            try:
+                super().close()  # flush()
+            finally:
+                try:
+                    self._stream.close()
+                finally:
+                    self._raw.close()
+
+def _fsync(f) -> None:
+    f.flush()
+    try:
+        os.fsync(f.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+
+class _BatchedWriter:
+    def __init__(self, fsync: str = "never", batch_size: int = DEFAULT_BATCH_SIZE):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy: {fsync!r}")
+        self.fsync = fsync
+        self.batch_size = max(1, batch_size)
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JsonlWriter(_BatchedWriter):
+    """
+    1行1レコードの JSONL を書く。write() はそのレコードの（非圧縮での）先頭バイト位置を返す。
+    tell() は flush 済みかどうかに関係なく、これまで書いたレコード全体の非圧縮バイト数。
+    """
+
+    def __init__(self, path: str, mode: str = "w", compression: Optional[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 fsync: str = "never", ensure_ascii: bool = False):
+        super().__init__(fsync, batch_size)
+        self.path = path
+        self.compression = compression or compression_from_path(path)
+        start = os.path.getsize(path) if mode == "a" and os.path.exists(path) else 0
+        self._f = open_binary(path, mode + "b", self.compression, buffer_size)
+        self._pos = start if self.compression == "none" else 0
+        self._batch: List[bytes] = []
+        self._dumps = json.JSONEncoder(ensure_ascii=ensure_ascii).encode
+
+    def write(self, obj) -> int:
+        line = (self._dumps(obj) + "\n").encode("utf-8")
+        offset = self._pos
+        self._pos += len(line)
+        self._batch.append(line)
+        self.count += 1
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+        return offset
+
+    def write_many(self, objs: Iterable) -> None:
+        for obj in objs:
+            self.write(obj)
+
+    def _flush_batch(self) -> None:
+        if self._batch:
+            self._f.write(b"".join(self._batch))
+            self._batch = []
+            if self.fsync == "batch":
+                _fsync(self._f)
+
+    def flush(self) -> None:
+        self._flush_batch()
+        self._f.flush()
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if self._f is None:
+            return
+        self._flush_batch()
+        if self.fsync in ("batch", "close"):
+            _fsync(self._f)
+        self._f.close()
+        self._f = None
+
+class CsvWriter(_BatchedWriter):
+    """
+    ヘッダ付き CSV をバッチ単位の writerows で書く。
+    path の代わりに書き込み可能なバイナリストリーム（zip のメンバーなど）を渡してもよい（close で一緒に閉じる）。
+    """
+
+    def __init__(self, path, columns: Sequence[str], compression: Optional[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 fsync: str = "never"):
+        super().__init__(fsync, batch_size)
+        if isinstance(path, str):
+            self.path = path
+            self._f = open_text(path, "w", compression, buffer_size, newline="")
+        else:
+            self.path = getattr(path, "name", None)
+            self._f = io.TextIOWrapper(path, encoding="utf-8", newline="")
+        self._w = csv.writer(self._f)
+        self._w.writerow(columns)
+        self._batch: List[Sequence] = []
+
+    def writerow(self, row: Sequence) -> None:
+        self._batch.append(row)
+        self.count += 1
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+
+    def _flush_batch(self) -> None:
+        if self._batch:
+            self._w.writerows(self._batch)
+            self._batch = []
+            if self.fsync == "batch":
+                _fsync(self._f)
+
+    def flush(self) -> None:
+        self._flush_batch()
+        self._f.flush()
+
+    def close(self) -> None:
+        if self._f is None:
+            return
+        self._flush_batch()
+        if self.fsync in ("batch", "close"):
+            _fsync(self._f)
+        self._f.close()
+        self._f = None
+
+def add_output_args(ap, default_compression: Optional[str] = "none") -> None:
+    """生成・エクスポート共通の出力オプションを argparse に足す。"""
+    ap.add_argument("--compress", choices=COMPRESSIONS, default=default_compression,
+                    help="Stream-compress the output (adds .gz/.bz2/.xz/.zst)")
+    ap.add_argument("--write-batch", type=int, default=DEFAULT_BATCH_SIZE,
+                    help="Records serialized per write() call")
+    ap.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE, help="File buffer size in bytes")
+    ap.add_argument("--fsync", choices=FSYNC_POLICIES, default="never",
+                    help="never / batch (fsync after each batch) / close (fsync once at the end)")
+
+def output_kwargs(args) -> Dict:
+    return {"batch_size": args.write_batch, "buffer_size": args.buffer_size, "fsync": args.fsync}
@@ -0,0 +1,187 @@
+"""
+Low-overhead counters / timers shared by run_generate, run_quality and export_csv.
+
+    from sdlg_edu import instrument as inst
+    inst.STATS.incr("accepted", topic=topic)
+    with inst.STATS.timer("paraphrase"):
+        ...
+    inst.STATS.observe("trials", n)
+
+既定の STATS は何もしない NullStats（呼び出しコストだけ）。--metrics-out / --progress-every を
+付けたときだけ enable() で本物の Stats に差し替える。ワーカープロセスの Stats は snapshot() を
+返して親で merge_snapshot() する。
+"""
+
+from __future__ import annotations
+import json
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+class _Timer:
+    # キーごとに1個を使い回す（同じキーの入れ子は想定しない）
+    __slots__ = ("_slot", "_t0")
+
+    def __init__(self, slot):
+        self._slot = slot
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        slot = self._slot
+        slot[0] += 1
+        slot[1] += time.perf_counter() - self._t0
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class NullStats:
+    enabled = False
+
+    def incr(self, key: str, n: int = 1, topic: Optional[str] = None) -> None:
+        pass
+
+    def timer(self, key: str):
+        return _NULL_TIMER
+
+    def observe(self, key: str, value) -> None:
+        pass
+
+    def tick(self, n: int = 1) -> None:
+        pass
+
+class Stats:
+    """
+    counters   : 名前 → 件数
+    timers     : 段階名 → [呼び出し回数, 合計秒]
+    histograms : 名前 → {値: 回数}（試行回数の分布など、値の種類が少ないもの）
+    topics     : topic → {名前: 件数}
+    tick() は処理済み件数（items）を進め、progress_every 秒ごとに進捗行を stderr に出す。
+    """
+
+    enabled = True
+
+    def __init__(self, name: str, progress_every: float = 0.0, stream=None):
+        self.name = name
+        self.counters: Dict[str, int] = {}
+        self.timers: Dict[str, list] = {}
+        self.histograms: Dict[str, Dict] = {}
+        self.topics: Dict[str, Dict[str, int]] = {}
+        self.items = 0
+        self.started = time.perf_counter()
+        self.progress_every = progress_every
+        self.stream = stream or sys.stderr
+        self._next_progress = self.started + progress_every
+        self._timer_cms: Dict[str, _Timer] = {}
+
+    def incr(self, key: str, n: int = 1, topic: Optional[str] = None) -> None:
+        self.counters[key] = self.counters.get(key, 0) + n
+        if topic is not None:
+            t = self.topics.setdefault(topic, {})
+            t[key] = t.get(key, 0) + n
+
+    def timer(self, key: str) -> _Timer:
+        cm = self._timer_cms.get(key)
+        if cm is None:
+            cm = self._timer_cms[key] = _Timer(self.timers.setdefault(key, [0, 0.0]))
+        return cm
+
+    def observe(self, key: str, value) -> None:
+        h = self.histograms.setdefault(key, {})
+        h[value] = h.get(value, 0) + 1
+
+    def tick(self, n: int = 1) -> None:
+        self.items += n
+        if self.progress_every > 0:
+            now = time.perf_counter()
+            if now >= self._next_progress:
+                self._next_progress = now + self.progress_every
+                self.progress_line(now)
+
+    def progress_line(self, now: Optional[float] = None) -> None:
+        elapsed = (now or time.perf_counter()) - self.started
+        rate = self.items / elapsed if elapsed > 0 else 0.0
+        print(f"[{self.name}] {self.items} items | {rate:,.1f} items/s | {elapsed:,.1f}s", file=self.stream)
+
+    def merge_snapshot(self, snap: Dict) -> None:
+        """別プロセスの snapshot() を足し込む（経過時間は自分のものを使う）。"""
+        self.items += snap.get("items", 0)
+        for k, v in snap.get("counters", {}).items():
+            self.counters[k] = self.counters.get(k, 0) + v
+        for k, v in snap.get("timers", {}).items():
+            slot = self.timers.setdefault(k, [0, 0.0])
+            slot[0] += v["calls"]
+            slot[1] += v["seconds"]
+        for k, h in snap.get("histograms", {}).items():
+            mine = self.histograms.setdefault(k, {})
+            for value, c in h.items():
+                value = int(value) if isinstance(value, str) and value.lstrip("-").isdigit() else value
+                mine[value] = mine.get(value, 0) + c
+        for topic, cs in snap.get("topics", {}).items():
+            for k, v in cs.items():
+                t = self.topics.setdefault(topic, {})
+                t[k] = t.get(k, 0) + v
+
+    def snapshot(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "name": self.name,
+            "elapsed_s": round(elapsed, 6),
+            "items": self.items,
+            "items_per_s": round(self.items / elapsed, 3) if elapsed > 0 else 0.0,
+            "counters": dict(self.counters),
+            "timers": {k: {"calls": c, "seconds": round(s, 6),
+                           "mean_us": round(s / c * 1e6, 3) if c else 0.0}
+                       for k, (c, s) in sorted(self.timers.items())},
+            "histograms": {k: {str(v): c for v, c in sorted(h.items())} for k, h in self.histograms.items()},
+            "topics": self.topics,
+        }
+
+    def write(self, path: str) -> None:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+STATS = NullStats()
+
+def enable(name: str, progress_every: float = 0.0) -> Stats:
+    global STATS
+    STATS = Stats(name, progress_every)
+    return STATS
+
+def disable() -> None:
+    global STATS
+    STATS = NullStats()
+
+def add_metrics_args(ap) -> None:
+    ap.add_argument("--metrics-out", help="Write per-stage counters/timers/throughput as JSON to this path")
+    ap.add_argument("--progress-every", type=float, default=0.0,
+                    help="Print a progress line to stderr every N seconds (0 = off)")
+
+def setup(name: str, args):
+    """--metrics-out / --progress-every のどちらかがあれば計測を有効にする。"""
+    if args.metrics_out or args.progress_every > 0:
+        return enable(name, args.progress_every)
+    return STATS
+
+def finish(args) -> None:
+    if isinstance(STATS, Stats):
+        if args.progress_every > 0:
+            STATS.progress_line()
+        if args.metrics_out:
+            STATS.write(args.metrics_out)
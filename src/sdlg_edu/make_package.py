@@ -1,14 +1,327 @@
-import argparse, os, zipfile
+import os, sys
+if not __package__:  # python src/sdlg_edu/make_package.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse, hashlib, io, json, stat, struct, time, zipfile, zlib
+from collections import deque
+
+from sdlg_edu import fileio
+
+MANIFEST_NAME = "MANIFEST.json"
+DATA_EXTS = (".jsonl", ".csv")
+
+class RowCounter:
+    """
+    データファイルの行数を先頭から流し読みで数える（CSV はヘッダ行を除き、引用符で囲んだセル内の改行は数えない）。
+    データファイル以外は rows() が None。
+    """
+
+    __slots__ = ("kind", "newlines", "_quoted", "_last")
+
+    def __init__(self, name: str):
+        self.kind = None if not name.endswith(DATA_EXTS) else "csv" if name.endswith(".csv") else "jsonl"
+        self.newlines = 0
+        self._quoted = False
+        self._last = b""
+
+    def update(self, block: bytes) -> None:
+        if self.kind is None or not block:
+            return
+        self._last = block[-1:]
+        if self.kind == "csv" and (self._quoted or b'"' in block):
+            # '"' で区切ると引用符の外と内が交互に並ぶ（"" のエスケープは空の内側として数が合う）
+            parts = block.split(b'"')
+            self.newlines += sum(parts[i].count(b"\n") for i in range(1 if self._quoted else 0, len(parts), 2))
+            self._quoted ^= (len(parts) - 1) % 2 == 1
+        else:
+            self.newlines += block.count(b"\n")
+
+    def rows(self):
+        if self.kind is None:
+            return None
+        rows = self.newlines + (1 if self._last not in (b"", b"\n") else 0)
+        if self.kind == "csv" and rows:
+            rows -= 1
+        return rows
+
+def _pack_chunk(task):
+    # ワーカープロセス側：親が読んだチャンクを raw deflate（--store なら無圧縮）し、CRC / sha256 を返す
+    buf, store, level = task
+    if store:
+        data = buf
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+        data = c.compress(buf) + c.flush()
+    return {
+        "data": data,
+        "size": len(buf),
+        "crc": zlib.crc32(buf),
+        "sha256": hashlib.sha256(buf).hexdigest(),
+    }
+
+def _bounded_map(ex, fn, tasks, window):
+    # 順序を保ったまま、同時に抱える結果を window 個までに抑える
+    pending = deque()
+    for task in tasks:
+        pending.append(ex.submit(fn, task) if ex else task)
+        if len(pending) >= window:
+            head = pending.popleft()
+            yield head.result() if ex else fn(head)
+    while pending:
+        head = pending.popleft()
+        yield head.result() if ex else fn(head)
+
+def _dos_datetime(ts: float):
+    t = time.localtime(ts)
+    return (t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2,
+            max(0, t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday)
+
+class PrecompressedZipWriter:
+    """
+    ワーカーで圧縮済みのデータをそのままメンバーとして並べる最小の zip 書き出し（--chunk-mb 用）。
+    zipfile には圧縮済みデータを渡す公開 API が無いので、ローカルヘッダ・中央ディレクトリ・終端レコード
+    （4 GiB / 65535 件を超えたら ZIP64）をこのクラスで書く。zipfile の内部状態には触らない。
+    """
+
+    ZIP64_LIMIT = zipfile.ZIP64_LIMIT
+
+    def __init__(self, path: str):
+        self._f = open(path, "wb")
+        self._entries = []  # (name, method, dostime, dosdate, crc, csize, usize, offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self._f.close()
+        return False
+
+    def add(self, name: str, data: bytes, size: int, crc: int, store: bool, mtime: float = None) -> None:
+        """data は raw deflate（store なら生データ）、size / crc は展開後のもの。"""
+        method = zipfile.ZIP_STORED if store else zipfile.ZIP_DEFLATED
+        dostime, dosdate = _dos_datetime(time.time() if mtime is None else mtime)
+        fname = name.encode("utf-8")
+        flags = 0 if fname.isascii() else 0x800
+        zip64 = size >= self.ZIP64_LIMIT or len(data) >= self.ZIP64_LIMIT
+        extra = struct.pack("<HHQQ", 1, 16, size, len(data)) if zip64 else b""
+        offset = self._f.tell()
+        self._f.write(struct.pack("<IHHHHHIIIHH", 0x04034b50, 45 if zip64 else 20, flags, method, dostime, dosdate,
+                                  crc, 0xFFFFFFFF if zip64 else len(data), 0xFFFFFFFF if zip64 else size,
+                                  len(fname), len(extra)))
+        self._f.write(fname)
+        self._f.write(extra)
+        self._f.write(data)
+        self._entries.append((fname, flags, method, dostime, dosdate, crc, len(data), size, offset))
+
+    def writestr(self, name: str, data, level: int = zlib.Z_DEFAULT_COMPRESSION) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.add(name, c.compress(data) + c.flush(), len(data), zlib.crc32(data), store=False)
+
+    def close(self) -> None:
+        f = self._f
+        if f.closed:
+            return
+        limit = self.ZIP64_LIMIT
+        cd_start = f.tell()
+        for fname, flags, method, dostime, dosdate, crc, csize, usize, offset in self._entries:
+            # ZIP64 拡張には 0xFFFFFFFF にした項目だけを usize, csize, offset の順で入れる
+            big = [v for v in (usize, csize, offset) if v >= limit]
+            extra = struct.pack(f"<HH{len(big)}Q", 1, 8 * len(big), *big) if big else b""
+            f.write(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, 3 << 8 | 45, 45 if big else 20, flags, method,
+                                dostime, dosdate, crc, *(0xFFFFFFFF if v >= limit else v for v in (csize, usize)),
+                                len(fname), len(extra), 0, 0, 0, (stat.S_IFREG | 0o644) << 16,
+                                0xFFFFFFFF if offset >= limit else offset))
+            f.write(fname)
+            f.write(extra)
+        cd_end = f.tell()
+        n, cd_size = len(self._entries), cd_end - cd_start
+        if n >= 0xFFFF or cd_start >= limit or cd_size >= limit:
+            f.write(struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 3 << 8 | 45, 45, 0, 0, n, n, cd_size, cd_start))
+            f.write(struct.pack("<IIQI", 0x07064b50, 0, cd_end, 1))
+            f.write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0))
+        else:
+            f.write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, n, n, cd_size, cd_start, 0))
+        f.close()
+
+def _file_entry_streaming(path: str):
+    # 非チャンクモード用：ファイルを流し読みして sha256 / 行数を取る
+    h = hashlib.sha256()
+    name = os.path.basename(path)
+    rows = RowCounter(name)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+            rows.update(block)
+    return {"name": name, "size": os.path.getsize(path), "sha256": h.hexdigest(), "rows": rows.rows()}
+
+class MemberWriter(io.RawIOBase):
+    """
+    zf の新しいメンバーへ順に書き込みながら sha256 / サイズ / 行数を取る
+    （pipeline.py が CSV をディスクに書かずに直接アーカイブへ流す用）。close 後に entry() で MANIFEST の項目。
+    """
+
+    def __init__(self, zf: zipfile.ZipFile, name: str):
+        self.name = name
+        self._dst = zf.open(name, "w", force_zip64=True)
+        self._h = hashlib.sha256()
+        self._size = 0
+        self._rows = RowCounter(name)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        b = bytes(b)
+        self._dst.write(b)
+        self._h.update(b)
+        self._size += len(b)
+        self._rows.update(b)
+        return len(b)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._dst.close()
+        super().close()
+
+    def entry(self):
+        return {"name": self.name, "size": self._size, "sha256": self._h.hexdigest(),
+                "rows": self._rows.rows()}
+
+def write_manifest(zf, files) -> None:
+    # zf は zipfile.ZipFile か PrecompressedZipWriter（どちらも writestr を持つ）
+    manifest = {"version": 1, "files": files}
+    zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+def verify_package(path: str) -> int:
+    """
+    書き上がった zip を開き直し、MANIFEST.json の sha256 / サイズと各メンバーの中身を突き合わせる。
+    分割したファイルはチャンクごとと、つなげたファイル全体の両方を確かめる。確かめたファイル数を返す。
+    """
+    def digest(zf, members):
+        h, size = hashlib.sha256(), 0
+        for m in members:
+            with zf.open(m) as src:
+                for block in iter(lambda: src.read(1 << 20), b""):
+                    h.update(block)
+                    size += len(block)
+        return h.hexdigest(), size
+
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+        for e in manifest["files"]:
+            chunks = e.get("chunks")
+            if chunks:
+                for c in chunks:
+                    if digest(zf, [c["member"]]) != (c["sha256"], c["size"]):
+                        raise ValueError(f"{path}: member {c['member']} does not match {MANIFEST_NAME}")
+                members = [c["member"] for c in chunks]
+            else:
+                members = [e["name"]]
+            if digest(zf, members) != (e["sha256"], e["size"]):
+                raise ValueError(f"{path}: {e['name']} does not match {MANIFEST_NAME}")
+    return len(manifest["files"])
+
+def package_chunked(zw: PrecompressedZipWriter, paths, chunk_bytes: int, workers: int, store: bool, level: int):
+    """
+    各ファイルを行境界で chunk_bytes 程度に分け（小さいファイルは1メンバーのまま）、
+    チャンクの圧縮とハッシュをプロセスプールで並列に行い、結果を順にアーカイブへ流し込む。
+    ファイルは親が先頭から1回だけ読み、そのついでにファイル全体の sha256 と行数を取る（チャンクはワーカーへ渡す）。
+    """
+    plan = []  # (path, part_no, n_parts, start, end)
+    for p in paths:
+        size = os.path.getsize(p)
+        n = max(1, -(-size // chunk_bytes)) if p.endswith(DATA_EXTS) else 1
+        ranges = fileio.split_line_ranges(p, n) or [(0, 0)]
+        plan += [(p, i, len(ranges), a, b) for i, (a, b) in enumerate(ranges)]
+
+    entries = {}
+    counters = {}
+    chunk_rows = []  # plan と同じ順。読んだ時点の行数の増分
+
+    def tasks():
+        # _bounded_map が window 個ずつしか引かないので、読んだまま抱えるチャンクも window 個まで
+        for p, _, _, a, b in plan:
+            entry = entries.get(p)
+            if entry is None:
+                name = os.path.basename(p)
+                entry = entries[p] = {"name": name, "size": 0, "sha256": hashlib.sha256(), "rows": None, "chunks": []}
+                counters[p] = RowCounter(name)
+            with open(p, "rb") as f:
+                f.seek(a)
+                buf = f.read(b - a)
+            entry["sha256"].update(buf)
+            counter = counters[p]
+            before = counter.rows() or 0
+            counter.update(buf)
+            rows = counter.rows()
+            chunk_rows.append(None if rows is None else rows - before)
+            yield buf, store, level
+
+    ex = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor  # multiprocessing 一式は並列のときだけ読み込む
+        ex = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for i, ((p, part, n_parts, a, b), chunk) in enumerate(
+                zip(plan, _bounded_map(ex, _pack_chunk, tasks(), max(2, 2 * workers)))):
+            name = os.path.basename(p)
+            member = name if n_parts == 1 else f"{name}.part{part:04d}"
+            zw.add(member, chunk["data"], chunk["size"], chunk["crc"], store, os.path.getmtime(p))
+            entry = entries[p]
+            entry["size"] += chunk["size"]
+            entry["chunks"].append({"member": member, "offset": a, "size": chunk["size"],
+                                    "sha256": chunk["sha256"], "rows": chunk_rows[i]})
+    finally:
+        if ex:
+            ex.shutdown()
+    out = []
+    for p in paths:
+        e = entries[p]
+        e["sha256"] = e["sha256"].hexdigest()
+        e["rows"] = counters[p].rows()
+        if len(e["chunks"]) == 1:
+            e.pop("chunks")
+        out.append(e)
+    return out
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", required=True)
     ap.add_argument("--report", required=True)
     ap.add_argument("--readme", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--chunk-mb", type=int, default=0,
+                    help="Split data files into ~N MiB line-aligned members compressed in parallel (0 = off)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="Compression processes for --chunk-mb")
+    ap.add_argument("--store", action="store_true",
+                    help="Store members without recompressing (for already-compressed inputs)")
+    ap.add_argument("--level", type=int, default=zlib.Z_DEFAULT_COMPRESSION, help="Deflate level for --chunk-mb")
+    ap.add_argument("--verify", action="store_true",
+                    help="Re-read the finished archive and check every member against MANIFEST.json")
     a = ap.parse_args()
     os.makedirs(os.path.dirname(a.out), exist_ok=True)
-    with zipfile.ZipFile(a.out, "w", zipfile.ZIP_DEFLATED) as zf:
-        for p in (a.data, a.report, a.readme):
-            if os.path.exists(p): zf.write(p, arcname=os.path.basename(p))
+    paths = [p for p in (a.data, a.report, a.readme) if os.path.exists(p)]
+    if a.chunk_mb > 0:
+        with PrecompressedZipWriter(a.out) as zw:
+            files = package_chunked(zw, paths, a.chunk_mb << 20, a.workers, a.store, a.level)
+            write_manifest(zw, files)
+    else:
+        method = zipfile.ZIP_STORED if a.store else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(a.out, "w", method) as zf:
+            files = []
+            for p in paths:
+                zf.write(p, arcname=os.path.basename(p))
+                files.append(_file_entry_streaming(p))
+            write_manifest(zf, files)
+    if a.verify:
+        try:
+            verify_package(a.out)
+        except ValueError as e:
+            sys.exit(str(e))
     print(f"Packaged -> {a.out}")
 if __name__ == "__main__": main()
@@ -0,0 +1,237 @@
+"""
+MinHash signatures + LSH banding for near-duplicate ("semantic dup") detection.
+
+- MinHasher      : テキスト → 長さ num_perm の MinHash 署名。シングルは WORD_RE トークンの
+                   shingle-gram（ngrams.ngram_hashes）で、置換 h_i(x) = ((a_i x + b_i) mod 2**64) >> 32
+- LSHIndex       : 署名を bands × rows に切り、band ごとのバケットで候補を引く（全件比較しない）。
+                   候補は署名の一致率（Jaccard 推定値）で threshold 以上かを確かめる
+- NearDupDetector: 品質指標用。追加順に既出との近似重複を調べ、union-find でクラスタにまとめる
+- NoveltyIndex   : 生成用。ngram_index の索引を包み、近似重複する候補を 5-gram 判定と同じ口で弾く
+
+bands は threshold ≈ (1/bands) ** (1/rows) になるよう選ぶ（optimal_bands）。
+"""
+
+from __future__ import annotations
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sdlg_edu.ngrams import MASK64, ngram_hashes
+
+try:
+    import numpy as np
+except ImportError:  # 署名計算を NumPy でまとめるだけ。無くても同じ値になる
+    np = None
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_PERMS = 64
+DEFAULT_SHINGLE = 3
+
+def optimal_bands(num_perm: int, threshold: float) -> int:
+    """num_perm を割り切る bands のうち、(1/bands)**(1/rows) が threshold に最も近いもの。"""
+    best, best_err = 1, None
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best_err is None or err < best_err:
+            best, best_err = bands, err
+    return best
+
+class MinHasher:
+    def __init__(self, num_perm: int = DEFAULT_PERMS, shingle: int = DEFAULT_SHINGLE, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle = shingle
+        r = random.Random(seed)
+        # a は奇数（mod 2**64 で全単射）
+        self.perms = [(r.getrandbits(64) | 1, r.getrandbits(64)) for _ in range(num_perm)]
+        if np is not None:
+            self._a = np.array([a for a, _ in self.perms], dtype=np.uint64)[:, None]
+            self._b = np.array([b for _, b in self.perms], dtype=np.uint64)[:, None]
+
+    def shingles(self, text: str) -> List[int]:
+        xs = ngram_hashes(text, self.shingle)
+        if not xs:
+            # shingle 語に満たない短文は単語単位で
+            xs = ngram_hashes(text, 1)
+        return xs
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        xs = self.shingles(text)
+        if not xs:
+            return None
+        if np is not None:
+            v = np.array(xs, dtype=np.uint64)[None, :]
+            return tuple(((self._a * v + self._b) >> np.uint64(32)).min(axis=1).tolist())
+        return tuple(min(((a * x + b) & MASK64) >> 32 for x in xs) for a, b in self.perms)
+
+def similarity(s1: Sequence[int], s2: Sequence[int]) -> float:
+    """署名の一致率（Jaccard 類似度の推定値）。"""
+    return sum(1 for a, b in zip(s1, s2) if a == b) / len(s1)
+
+class LSHIndex:
+    """
+    完全一致の署名は最初の1件だけをバケットに入れ、各バケットは max_bucket 件で打ち止めにする
+    （同型の問題が大量にあってもバケットが伸び続けて照合が全件比較にならないように）。
+    打ち止め後の新顔は、同じバケットの既存メンバー経由でつながる。
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_PERMS, bands: int = 8, max_bucket: int = 64):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_bucket = max_bucket
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+        self._exact: Dict[Tuple[int, ...], int] = {}
+        self.signatures: List[Tuple[int, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _keys(self, sig):
+        rows = self.rows
+        return [sig[i * rows:(i + 1) * rows] for i in range(self.bands)]
+
+    def candidates(self, sig) -> set:
+        out = set()
+        for bucket, key in zip(self._buckets, self._keys(sig)):
+            hit = bucket.get(key)
+            if hit:
+                out.update(hit)
+        return out
+
+    def query(self, sig, threshold: float) -> List[Tuple[int, float]]:
+        """threshold 以上に似た登録済み署名の (番号, 推定類似度)。"""
+        sigs = self.signatures
+        same = self._exact.get(sig)
+        if same is not None:
+            return [(same, 1.0)]
+        found = []
+        for i in sorted(self.candidates(sig)):
+            s = similarity(sig, sigs[i])
+            if s >= threshold:
+                found.append((i, s))
+        return found
+
+    def add(self, sig) -> int:
+        i = len(self.signatures)
+        self.signatures.append(sig)
+        if sig in self._exact:
+            return i
+        self._exact[sig] = i
+        for bucket, key in zip(self._buckets, self._keys(sig)):
+            members = bucket.setdefault(key, [])
+            if len(members) < self.max_bucket:
+                members.append(i)
+        return i
+
+class NearDupDetector:
+    """
+    add() した順に、既出と threshold 以上似ているものをつなぐ。
+      near_dup_rate = 既出のどれかと近似重複した件数 / 全件
+      clusters()    = 2件以上のクラスタ（id のリスト、大きい順）
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_PERMS,
+                 shingle: int = DEFAULT_SHINGLE):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle)
+        self.lsh = LSHIndex(num_perm, optimal_bands(num_perm, threshold))
+        self.ids: List[str] = []
+        self.total = 0
+        self.dups = 0
+        self._parent: Dict[int, int] = {}
+
+    def _find(self, i: int) -> int:
+        parent = self._parent
+        root = i
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(i, i) != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def add(self, record_id: str, text: str) -> None:
+        self.add_signature(record_id, self.hasher.signature(text))
+
+    def add_signature(self, record_id: str, sig) -> None:
+        self.total += 1
+        if sig is None:
+            return
+        matches = self.lsh.query(sig, self.threshold)
+        i = self.lsh.add(sig)
+        self.ids.append(record_id)
+        if matches:
+            self.dups += 1
+            for j, _ in matches:
+                self._parent[self._find(i)] = self._find(j)
+
+    def merge(self, other: "NearDupDetector") -> None:
+        """後ろのチャンクの分を追加順に入れ直す（署名は計算済みなので照合だけ）。"""
+        self.total += other.total - len(other.ids)  # 署名なし（空テキスト）の件数
+        for record_id, sig in zip(other.ids, other.lsh.signatures):
+            self.add_signature(record_id, sig)
+
+    def rate(self) -> float:
+        return self.dups / self.total if self.total else 0.0
+
+    def clusters(self) -> List[List[str]]:
+        groups: Dict[int, List[str]] = {}
+        for i in list(self._parent):
+            groups.setdefault(self._find(i), []).append(i)
+        out = []
+        for root, members in groups.items():
+            rows = sorted(set(members) | {root})
+            out.append([self.ids[i] for i in rows])
+        out.sort(key=lambda c: (-len(c), c[0]))
+        return out
+
+class NoveltyIndex:
+    """
+    ngram_index の索引を包み、同じインターフェース（text_keys / count_hits / |= / len）で
+    近似重複のチェックを足す。text_keys() が返すキー集合に MinHash 署名をぶら下げ、
+    既出と threshold 以上似ていれば count_hits() が全件ヒット扱い（重なり率 1.0）を返すので、
+    build_with_dedup などの既存の判定がそのまま「再生成」に倒れる。
+    """
+
+    def __init__(self, inner, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_PERMS,
+                 shingle: int = DEFAULT_SHINGLE):
+        self.inner = inner
+        self.kind = inner.kind
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle)
+        self.lsh = LSHIndex(num_perm, optimal_bands(num_perm, threshold))
+        self.rejected = 0
+
+    def text_keys(self, text: str, n: int = 5):
+        keys = _SignedKeys(self.inner.text_keys(text, n))
+        keys.signature = self.hasher.signature(text)
+        return keys
+
+    def count_hits(self, keys) -> int:
+        sig = getattr(keys, "signature", None)
+        if sig is not None and self.lsh.query(sig, self.threshold):
+            self.rejected += 1
+            return len(keys)
+        return self.inner.count_hits(keys)
+
+    def add_all(self, keys) -> None:
+        self.inner.add_all(keys)
+        sig = getattr(keys, "signature", None)
+        if sig is not None:
+            self.lsh.add(sig)
+
+    def __ior__(self, keys):
+        self.add_all(keys)
+        return self
+
+    def __contains__(self, key) -> bool:
+        return key in self.inner
+
+    def __len__(self) -> int:
+        return len(self.inner)
+
+class _SignedKeys(set):
+    # 5-gram キー集合 + そのテキストの MinHash 署名
+    signature = None
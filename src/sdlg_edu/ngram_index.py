@@ -0,0 +1,175 @@
+"""
+Pluggable n-gram indexes for the generation-time dedup gate.
+
+All indexes share one small interface:
+  - text_keys(text)   : テキストから索引用キーの set（set は 5-gram 文字列、hashed / bloom は文字列を作らず
+                        ngrams.ngram_hashes）。キーは必ずこれで作る（索引ごとにキー空間が違う）
+  - count_hits(keys)  : 既出キーの数
+  - add_all(keys)     : キーを登録（`index |= keys` でも可）
+  - len(index)        : 登録済みキー数（bloom は推定値）
+
+Kinds (--ngram-index):
+  set    : 文字列そのものを set に保持。厳密・既存互換だがメモリは無制限。
+  hashed : 64-bit ハッシュを array('Q') の open addressing 表に保持（1 gram ≈ 12〜23 byte）。
+           偽陽性は異なる gram のハッシュ衝突のみで、登録数 n に対し 1 回の照会あたり ≈ n / 2**64
+           （n = 1e9 でも 5e-11 程度）。
+  bloom  : 固定サイズの Bloom filter。capacity 件・目標偽陽性率 p に対し
+           m = -n ln p / (ln 2)**2 bit、k = (m / n) ln 2 個のハッシュを使う。
+           capacity を超えると偽陽性率は (1 - e**(-k n / m))**k に従って上がる（false_positive_rate() で確認可）。
+           偽陰性は無いので、重なり率は過大評価側（＝ゲートは保守的）にずれるだけ。
+"""
+
+from __future__ import annotations
+import math
+from array import array
+from typing import Iterable
+
+from sdlg_edu.ngrams import get_ngrams, ngram_hashes
+
+INDEX_KINDS = ("set", "hashed", "bloom")
+
+class SetNgramIndex:
+    kind = "set"
+
+    def __init__(self, capacity: int = 0):
+        self._set: set = set()
+
+    def text_keys(self, text: str, n: int = 5) -> set:
+        return set(get_ngrams(text, n))
+
+    def count_hits(self, keys: set) -> int:
+        return len(keys & self._set)
+
+    def add_all(self, keys: Iterable) -> None:
+        self._set.update(keys)
+
+    def __ior__(self, keys):
+        self.add_all(keys)
+        return self
+
+    def __contains__(self, key) -> bool:
+        return key in self._set
+
+    def __len__(self) -> int:
+        return len(self._set)
+
+class HashedNgramIndex:
+    kind = "hashed"
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity: int = 1 << 16):
+        size = 1 << max(4, math.ceil(math.log2(max(1, capacity) / self.MAX_LOAD)))
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def text_keys(self, text: str, n: int = 5) -> set:
+        return set(ngram_hashes(text, n))
+
+    def _slot(self, h: int) -> int:
+        # linear probing：h か空き(0)に当たった位置を返す
+        table, mask = self._table, self._mask
+        i = h & mask
+        while True:
+            v = table[i]
+            if v == 0 or v == h:
+                return i
+            i = (i + 1) & mask
+
+    def __contains__(self, h: int) -> bool:
+        return self._table[self._slot(h)] == h
+
+    def count_hits(self, keys: Iterable[int]) -> int:
+        return sum(1 for h in keys if h in self)
+
+    def add_all(self, keys: Iterable[int]) -> None:
+        for h in keys:
+            i = self._slot(h)
+            if self._table[i] == 0:
+                self._table[i] = h
+                self._count += 1
+                if self._count > self.MAX_LOAD * (self._mask + 1):
+                    self._grow()
+
+    def _grow(self) -> None:
+        old = self._table
+        size = 2 * (self._mask + 1)
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        for h in old:
+            if h:
+                self._table[self._slot(h)] = h
+
+    def __ior__(self, keys):
+        self.add_all(keys)
+        return self
+
+    def __len__(self) -> int:
+        return self._count
+
+    def nbytes(self) -> int:
+        return self._table.itemsize * len(self._table)
+
+class BloomNgramIndex:
+    kind = "bloom"
+
+    def __init__(self, capacity: int = 1 << 20, fp_rate: float = 1e-3):
+        capacity = max(1, capacity)
+        self.m = max(64, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self._bits = bytearray((self.m + 7) // 8)
+        self._added = 0
+
+    def text_keys(self, text: str, n: int = 5) -> set:
+        return set(ngram_hashes(text, n))
+
+    def _positions(self, h: int):
+        # double hashing：64-bit ハッシュの上下32bitから k 個の位置を作る
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def __contains__(self, h: int) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(h))
+
+    def count_hits(self, keys: Iterable[int]) -> int:
+        return sum(1 for h in keys if h in self)
+
+    def add_all(self, keys: Iterable[int]) -> None:
+        bits = self._bits
+        for h in keys:
+            for p in self._positions(h):
+                bits[p >> 3] |= 1 << (p & 7)
+            self._added += 1
+
+    def __ior__(self, keys):
+        self.add_all(keys)
+        return self
+
+    def __len__(self) -> int:
+        return self._added
+
+    def false_positive_rate(self) -> float:
+        """現在の登録数での理論偽陽性率。"""
+        return (1.0 - math.exp(-self.k * self._added / self.m)) ** self.k
+
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+def make_ngram_index(kind: str = "set", capacity: int = 1 << 20, fp_rate: float = 1e-3,
+                     novelty: float = 0.0):
+    """novelty > 0 なら minhash.NoveltyIndex で包み、その類似度以上の近似重複も弾く。"""
+    if kind == "set":
+        index = SetNgramIndex()
+    elif kind == "hashed":
+        index = HashedNgramIndex(capacity)
+    elif kind == "bloom":
+        index = BloomNgramIndex(capacity, fp_rate)
+    else:
+        raise ValueError(f"unknown n-gram index kind: {kind!r} (choose from {', '.join(INDEX_KINDS)})")
+    if novelty > 0:
+        from sdlg_edu.minhash import NoveltyIndex
+        index = NoveltyIndex(index, threshold=novelty)
+    return index
@@ -0,0 +1,173 @@
+"""
+Shared tokenization and n-gram hashing for the dedup gate (run_generate)
+and the dup_5gram_rate metric (run_quality).
+
+- tokenize / get_ngrams : 小文字トークンと 5-gram 文字列（set 索引・exact 指標は従来どおりこれを使う）
+- Vocab                 : トークン → 整数 id のインターン表。id ごとにプロセス間で安定な 64-bit ハッシュを持つ
+- ngram_hashes          : 1テキスト分の n-gram ハッシュ（純 Python・ローリング計算）
+- ngram_hashes_batch    : 複数テキストをまとめて計算。NumPy があれば整数配列のまま一括で、無ければ純 Python
+- DistinctHashes        : n-gram ハッシュの distinct 数（NumPy ならソートで重複を畳み、無ければ set）
+
+n-gram ハッシュはトークンハッシュ t の多項式 H = Σ t[i+j] * B**(n-1-j) mod 2**64。
+gram ごとに文字列を作らないので、join + blake2b より大幅に軽い。0 は 1 に寄せる（ngram_index の空き用）。
+"""
+
+from __future__ import annotations
+import hashlib
+from array import array
+from typing import Dict, Iterable, List, Sequence
+
+from sdlg_edu.text_utils import lazy_compile
+
+try:
+    import numpy as np
+except ImportError:  # NumPy は任意。無ければ純 Python 版で同じ値を出す
+    np = None
+
+WORD_RE = lazy_compile(r"[A-Za-z']+")
+# バッチ用：UTF-8 バイト列でトークン文字以外を空白にして split（非 ASCII は常に 0x80 以上なので WORD_RE と同じ分割）
+_SEP = b"\0"
+_TOKEN_BYTES = set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'") | {0}
+_BATCH_TABLE = bytes(c if c in _TOKEN_BYTES else 0x20 for c in range(256))
+MASK64 = (1 << 64) - 1
+BASE = 0x100000001B3  # FNV-1a 64 の素数（奇数なら何でもよい）
+
+def hash_gram(gram: str) -> int:
+    """プロセス間で安定な 64-bit ハッシュ（0 は空きスロット用に予約）。"""
+    h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+    return h or 1
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in WORD_RE.findall(text)]
+
+def get_ngrams(text: str, n: int = 5) -> List[str]:
+    toks = tokenize(text)
+    return [' '.join(toks[i:i+n]) for i in range(len(toks)-n+1)]
+
+class Vocab:
+    """
+    トークン（表記そのまま。str でも bytes でもよい）→ id のインターン表。id の順に小文字化した
+    トークンの 64-bit ハッシュを array('Q') で持つ（"The" / "the" / b"the" は別 id・同じハッシュ）。
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.hashes = array("Q")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def encode(self, tokens: Sequence[str]) -> List[int]:
+        ids = self.ids
+        try:
+            return list(map(ids.__getitem__, tokens))  # 語彙が育った後はほぼこちらで済む
+        except KeyError:
+            pass
+        for t in set(tokens).difference(ids):
+            ids[t] = len(self.hashes)
+            low = t.lower()
+            self.hashes.append(hash_gram(low.decode("utf-8") if isinstance(low, bytes) else low))
+        return list(map(ids.__getitem__, tokens))
+
+    def token_hashes(self, tokens: Sequence[str]) -> List[int]:
+        return list(map(self.hashes.__getitem__, self.encode(tokens)))
+
+DEFAULT_VOCAB = Vocab()
+
+def ngram_hashes(text: str, n: int = 5, vocab: Vocab = None) -> List[int]:
+    th = (vocab or DEFAULT_VOCAB).token_hashes(WORD_RE.findall(text))
+    if len(th) < n:
+        return []
+    lead = pow(BASE, n - 1, 1 << 64)
+    h = 0
+    for t in th[:n]:
+        h = (h * BASE + t) & MASK64
+    out = [h or 1]
+    for i in range(n, len(th)):
+        h = ((h - th[i - n] * lead) * BASE + th[i]) & MASK64
+        out.append(h or 1)
+    return out
+
+def ngram_hashes_batch(texts: Sequence[str], n: int = 5, vocab: Vocab = None):
+    """
+    全テキストの n-gram ハッシュを（テキスト順に連結して）返す。テキストをまたぐ窓は含まない。
+    NumPy があれば np.ndarray[uint64]、無ければ array('Q')。
+    """
+    vocab = vocab or DEFAULT_VOCAB
+    if np is None:
+        out = array("Q")
+        for text in texts:
+            out.extend(ngram_hashes(text, n, vocab))
+        return out
+    # 全テキストを区切り \0 で連結して一括でトークン化し、区切りをまたぐ窓を捨てる
+    tokens = " \0 ".join(texts).encode("utf-8").translate(_BATCH_TABLE).split()
+    width = len(tokens) - n + 1
+    if width <= 0:
+        return np.zeros(0, np.uint64)
+    ids = np.array(vocab.encode(tokens), dtype=np.intp)
+    th = np.array(vocab.hashes, dtype=np.uint64)[ids]
+    # Horner 法を n 本のずらした配列で：全窓を一度に計算（uint64 の桁あふれ = mod 2**64）
+    base = np.uint64(BASE)
+    h = th[:width].copy()
+    for j in range(1, n):
+        h *= base
+        h += th[j:j + width]
+    seps = np.concatenate(([0], np.cumsum(ids == vocab.ids.get(_SEP, -1))))
+    h = h[seps[n:] == seps[:width]]
+    h[h == 0] = 1
+    return h
+
+class DistinctHashes:
+    """
+    64-bit ハッシュの distinct 数。NumPy があれば追加分を溜めておき、
+    一定量ごとにソートして既存の distinct 配列と畳む。無ければ int の set。
+    """
+
+    COMPACT_EVERY = 1 << 22
+
+    def __init__(self):
+        if np is None:
+            self._set = set()
+        else:
+            self._uniq = np.zeros(0, np.uint64)
+            self._pending: List = []
+            self._pending_size = 0
+
+    def update(self, hashes) -> None:
+        if np is None:
+            self._set.update(hashes)
+            return
+        if len(hashes):
+            self._pending.append(np.asarray(hashes, dtype=np.uint64))
+            self._pending_size += len(hashes)
+            if self._pending_size >= self.COMPACT_EVERY:
+                self._compact()
+
+    def _compact(self) -> None:
+        if self._pending:
+            # np.unique 相当をソート + 隣接比較で（NumPy 2.x の np.unique はハッシュ実装で uint64 だと遅い）
+            a = np.sort(np.concatenate([self._uniq] + self._pending))
+            if len(a):
+                a = a[np.concatenate(([True], a[1:] != a[:-1]))]
+            self._uniq = a
+            self._pending = []
+            self._pending_size = 0
+
+    def merge(self, other: "DistinctHashes") -> None:
+        if np is None:
+            self._set |= other._set
+            return
+        other._compact()
+        self.update(other._uniq)
+
+    def __len__(self) -> int:
+        if np is None:
+            return len(self._set)
+        self._compact()
+        return len(self._uniq)
+
+    def __getstate__(self):
+        # 部分集計を別プロセスへ返すときは畳んでから送る
+        if np is not None:
+            self._compact()
+        return self.__dict__
@@ -0,0 +1,155 @@
+"""
+Precompiled paraphrase engine for the English fields.
+
+All rules are compiled once into a single pattern and applied with one
+re.sub callback per string, instead of one re.sub per rule:
+  - 「\\b<語句>\\b」形式の素の語句ルールはトライ正規表現1本にまとめ、マッチ文字列 → ルール番号の表で引く
+  - それ以外のルールは名前付きグループ (r0, r1, ...) の alternation としてその後ろに並べる
+ルール数が増えても1文字列あたりの走査は1パスのまま。
+choices は re.sub と同じく置換テンプレート（\\1, \\g<name>）として展開する。
+1本にまとめると効かなくなるルール（同じ語句・同じパターンの重複、パターン内の番号付き後方参照）は
+ParaphraseEngine が ValueError で弾く。
+
+Modes:
+  compat : 従来の _paraphrase_en と同じ RNG 消費（ルールごとに random()、採用時に choice()）。
+           置換は1パスなので、あるルールの置換結果に後続ルールが再マッチすることはない
+           （既定の PARA_EN ではそのような重なりは無く、出力は従来と一致する）。
+  fast   : 実際にマッチしたルールについてだけ、初回マッチ時に採否と置換語を決める。
+           RNG 消費が変わるので出力は compat と一致しない。
+"""
+
+from __future__ import annotations
+import json
+import random
+import re
+from typing import Dict, List, Sequence, Tuple
+
+from sdlg_edu.text_utils import lazy_compile, trie_pattern
+
+Rule = Tuple[str, List[str]]
+MODES = ("compat", "fast")
+
+_REGEX_META = set("\\.^$*+?{}[]|()")
+# パターン内の番号付き後方参照 \1 / 条件 (?(1)...)。まとめるとグループ番号がずれる
+_NUMBERED_REF = re.compile(r"(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?\(\d)")
+
+def load_rules(path: str) -> List[Rule]:
+    """
+    ルールファイルを読む。JSONL（1行 {"pattern": ..., "choices": [...]}）か、
+    同じ形の要素または [pattern, choices] を並べた JSON 配列。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        objs = json.loads(stripped)
+    else:
+        objs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    rules = []
+    for obj in objs:
+        if isinstance(obj, dict):
+            rules.append((obj["pattern"], list(obj["choices"])))
+        else:
+            pat, choices = obj
+            rules.append((pat, list(choices)))
+    return rules
+
+def _literal_body(pat: str):
+    # r"\bfoo bar\b" → "foo bar"（正規表現の特殊文字を含まないものだけ）
+    if pat.startswith(r"\b") and pat.endswith(r"\b") and len(pat) > 4:
+        body = pat[2:-2]
+        if not _REGEX_META & set(body):
+            return body
+    return None
+
+def check_rules(rules: Sequence[Rule]) -> None:
+    """1パスにまとめられないルールを ValueError で弾く（後ろの重複は決して当たらず、番号付き参照はずれる）。"""
+    seen_patterns, seen_bodies = set(), set()
+    for pat, _ in rules:
+        body = _literal_body(pat)
+        if pat in seen_patterns or (body is not None and body in seen_bodies):
+            raise ValueError(f"duplicate paraphrase rule: {pat!r} (merge its choices into the first rule)")
+        seen_patterns.add(pat)
+        if body is not None:
+            seen_bodies.add(body)
+        if _NUMBERED_REF.search(pat):
+            raise ValueError(f"paraphrase rule {pat!r} uses a numbered backreference; use (?P<name>...) and (?P=name)")
+
+class ParaphraseEngine:
+    def __init__(self, rules: Sequence[Rule], prob: float = 0.6, min_len: int = 40, mode: str = "compat"):
+        if mode not in MODES:
+            raise ValueError(f"unknown paraphrase mode: {mode!r}")
+        self.rules = [(pat, list(choices)) for pat, choices in rules]
+        check_rules(self.rules)
+        self.prob = prob
+        self.min_len = min_len
+        self.mode = mode
+
+        # 語句ルール → 表引き、その他 → 名前付きグループ
+        self._literals: Dict[str, int] = {}
+        parts = []
+        for i, (pat, _) in enumerate(self.rules):
+            body = _literal_body(pat)
+            if body is not None and body not in self._literals:
+                self._literals[body] = i
+            else:
+                parts.append(f"(?P<r{i}>{pat})")
+        if self._literals:
+            parts.insert(0, rf"(?P<lit>\b{trie_pattern(self._literals)}\b)")
+        self._regex = lazy_compile("|".join(parts)) if parts else None
+        # 置換テンプレートを含むルールは、そのルール単体の正規表現で同じ位置を照合し直して展開する
+        # （まとめた正規表現ではグループ番号がずれるため）
+        self._templated = {i: lazy_compile(pat) for i, (pat, choices) in enumerate(self.rules)
+                           if any("\\" in c for c in choices)}
+
+    def _rule_of(self, m) -> int:
+        name = m.lastgroup
+        if name == "lit":
+            return self._literals[m.group()]
+        return int(name[1:])
+
+    def _expand(self, i: int, m, out: str) -> str:
+        rx = self._templated.get(i)
+        if rx is None:
+            return out
+        return rx.match(m.string, m.start()).expand(out)
+
+    def apply(self, r: random.Random, s: str) -> str:
+        if not isinstance(s, str) or not s:
+            return s
+        if len(s) < self.min_len:
+            return s
+        if self.mode == "compat":
+            return self._apply_compat(r, s)
+        return self._apply_fast(r, s)
+
+    def _apply_compat(self, r: random.Random, s: str) -> str:
+        rand, choice, prob = r.random, r.choice, self.prob
+        repl: Dict[int, str] = {}
+        for i, (_, choices) in enumerate(self.rules):
+            if rand() < prob:
+                repl[i] = choice(choices)
+        if not repl or self._regex is None:
+            return s
+
+        def sub(m):
+            i = self._rule_of(m)
+            out = repl.get(i)
+            return m.group() if out is None else self._expand(i, m, out)
+
+        return self._regex.sub(sub, s)
+
+    def _apply_fast(self, r: random.Random, s: str) -> str:
+        if self._regex is None:
+            return s
+        decided: Dict[int, str] = {}
+        rules, prob = self.rules, self.prob
+
+        def sub(m):
+            i = self._rule_of(m)
+            if i not in decided:
+                decided[i] = r.choice(rules[i][1]) if r.random() < prob else None
+            out = decided[i]
+            return m.group() if out is None else self._expand(i, m, out)
+
+        return self._regex.sub(sub, s)
@@ -0,0 +1,85 @@
+"""
+Single-process release build: generate → quality → export → package in one streaming pass.
+
+    python src/sdlg_edu/pipeline.py --recipe recipes/grammar.jsonl --seed 42 --deterministic
+
+採用アイテムは run_generate.generate() の on_item から1件ずつ
+  - QualityAccumulator.add()（run_quality と同じ集計）
+  - CsvWriter（export_csv と同じ列・書式）→ zip のメンバーへ直接
+に流れる。JSONL は従来どおり --outdir に書くが、読み直して JSON をパースし直すことはしない。
+生成後に quality.json / quality_summary.md を書き、README と MANIFEST.json を足して zip を閉じる。
+成果物は Makefile の generate / quality / export / package を順に実行したものと同じ内容
+（CSV は outputs/ に置かず zip の中だけ）。品質ゲートに落ちたら zip は残さず終了コード 2。
+"""
+
+from __future__ import annotations
+import os, sys
+if not __package__:  # python src/sdlg_edu/pipeline.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse
+import io
+import json
+import zipfile
+
+from sdlg_edu import fileio, instrument as inst
+from sdlg_edu.export_csv import COLUMNS, to_row
+from sdlg_edu.make_package import MemberWriter, _file_entry_streaming, write_manifest
+from sdlg_edu.run_generate import add_generate_args, check_generate_args, generate
+from sdlg_edu.run_quality import QualityAccumulator, add_quality_args, quality_options, write_reports
+
+def main():
+    ap = argparse.ArgumentParser()
+    add_generate_args(ap)
+    add_quality_args(ap)
+    ap.add_argument("--reports-dir", default="reports")
+    ap.add_argument("--readme", default=os.path.join("docs", "EN_GRAMMAR_README.md"))
+    ap.add_argument("--package-out", default=os.path.join("dist", "english_grammar_qa_v1.0.zip"))
+    ap.add_argument("--csv-name", default="english_grammar_qa.csv", help="Name of the CSV member inside the zip")
+    inst.add_metrics_args(ap)
+    args = ap.parse_args()
+    check_generate_args(ap, args)
+    if args.resume or args.append:
+        # 品質集計と CSV は今回生成した分しか見ないので、既存行を含む成果物にならない
+        ap.error("--resume/--append are not supported by the pipeline; use the separate scripts")
+    stats = inst.setup("pipeline", args)
+
+    out_json = os.path.join(args.reports_dir, "quality.json")
+    out_md = os.path.join(args.reports_dir, "quality_summary.md")
+    os.makedirs(os.path.dirname(os.path.abspath(args.package_out)), exist_ok=True)
+    tmp_zip = args.package_out + ".tmp"
+
+    acc = QualityAccumulator(**quality_options(args))
+    # 途中で落ちても（ゲート不合格・Ctrl-C を含む）書きかけの .tmp を残さない
+    try:
+        with zipfile.ZipFile(tmp_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+            member = MemberWriter(zf, args.csv_name)
+            with fileio.CsvWriter(io.BufferedWriter(member, fileio.DEFAULT_BUFFER_SIZE), COLUMNS,
+                                  batch_size=args.write_batch) as csv_out:
+
+                def on_item(item):
+                    acc.add(item)
+                    with stats.timer("csv"):
+                        csv_out.writerow(to_row(item))
+
+                generate(ap, args, on_item)
+            metrics, passed = write_reports(acc, out_json, out_md)
+            files = [member.entry()]
+            for p in (out_json, args.readme):
+                if os.path.exists(p):
+                    zf.write(p, arcname=os.path.basename(p))
+                    files.append(_file_entry_streaming(p))
+            write_manifest(zf, files)
+
+        print(json.dumps({"metrics": metrics, "pass": passed}, ensure_ascii=False))
+        inst.finish(args)
+        if not passed:
+            raise SystemExit(2)
+    except BaseException:
+        if os.path.exists(tmp_zip):
+            os.remove(tmp_zip)
+        raise
+    os.replace(tmp_zip, args.package_out)
+    print(f"Packaged -> {args.package_out}  ({csv_out.count} rows)")
+
+if __name__ == "__main__":
+    main()
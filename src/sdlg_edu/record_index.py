@@ -0,0 +1,231 @@
+"""
+Random-access offset index ("<name>.jsonl.idx") for generated JSONL datasets.
+
+Layout (little-endian, same framing as sdlg_edu.columnar):
+    b"SDLGIDX1"
+    sections (8-byte aligned)
+    footer JSON (utf-8)
+    footer length (uint64)
+    b"SDLGIDX1"
+
+Footer:
+    {"version": 1, "rows": N, "source_size": S,
+     "offsets": {"offset": o, "length": l, "dtype": "<u8"},     # N+1 個（最後は S）
+     "ids": {"hashes": {..."<u8"}, "rows": {..."<u4"}},          # hash_gram(id) 昇順と対応する行番号
+     "postings": {"topic": {"<value>": {..."<u4"}}, "pattern": {...}, "difficulty": {...}}}
+
+RecordIndex は索引と JSONL 本体を mmap して、id 引き（二分探索）、
+topic などの値ごとの行一覧、値ごとの N 件サンプリングをファイル全体を読まずに行う。
+"""
+
+from __future__ import annotations
+import os, sys
+if not __package__:  # python src/sdlg_edu/record_index.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse
+import bisect
+import json
+import mmap
+import random
+import struct
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sdlg_edu.columnar import le_bytes
+from sdlg_edu.ngrams import hash_gram
+
+MAGIC = b"SDLGIDX1"
+VERSION = 1
+POSTING_FIELDS = ("topic", "pattern", "difficulty")
+SUFFIX = ".idx"
+
+def index_path_for(jsonl_path: str) -> str:
+    return jsonl_path + SUFFIX
+
+class RecordIndexBuilder:
+    """add(offset, record) をレコードの書き出し順に呼び、最後に write() する。"""
+
+    def __init__(self, fields: Sequence[str] = POSTING_FIELDS):
+        self.fields = tuple(fields)
+        self.offsets = array("Q")
+        self.id_hashes = array("Q")
+        self.postings: Dict[str, Dict[str, array]] = {f: {} for f in self.fields}
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add(self, offset: int, record: Dict) -> None:
+        row = len(self.offsets)
+        self.offsets.append(offset)
+        self.id_hashes.append(hash_gram(str(record.get("id", ""))))
+        for f in self.fields:
+            value = record.get(f)
+            if value is not None:
+                self.postings[f].setdefault(str(value), array("I")).append(row)
+
+    def write(self, path: str, source_size: int) -> None:
+        n = len(self.offsets)
+        order = sorted(range(n), key=self.id_hashes.__getitem__)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as out:
+            out.write(MAGIC)
+
+            def section(arr: array, dtype: str):
+                out.write(b"\0" * ((-out.tell()) % 8))
+                offset = out.tell()
+                out.write(le_bytes(arr))
+                return {"offset": offset, "length": out.tell() - offset, "dtype": dtype}
+
+            footer = {
+                "version": VERSION, "rows": n, "source_size": source_size,
+                "offsets": section(self.offsets + array("Q", [source_size]), "<u8"),
+                "ids": {"hashes": section(array("Q", (self.id_hashes[i] for i in order)), "<u8"),
+                        "rows": section(array("I", order), "<u4")},
+                "postings": {f: {v: section(rows, "<u4") for v, rows in sorted(vals.items())}
+                             for f, vals in self.postings.items()},
+            }
+            blob = json.dumps(footer, ensure_ascii=False).encode("utf-8")
+            out.write(blob)
+            out.write(struct.pack("<Q", len(blob)))
+            out.write(MAGIC)
+        os.replace(tmp, path)
+
+def build_index(jsonl_path: str, index_path: Optional[str] = None,
+                fields: Sequence[str] = POSTING_FIELDS) -> int:
+    """既存の（非圧縮）JSONL を1回なめて索引を作る。索引した行数を返す。"""
+    builder = RecordIndexBuilder(fields)
+    pos = 0
+    with open(jsonl_path, "rb") as f:
+        for line in f:
+            if line.strip():
+                builder.add(pos, json.loads(line))
+            pos += len(line)
+    builder.write(index_path or index_path_for(jsonl_path), pos)
+    return len(builder)
+
+class RecordIndex:
+    def __init__(self, jsonl_path: str, index_path: Optional[str] = None):
+        self.path = jsonl_path
+        self.index_path = index_path or index_path_for(jsonl_path)
+        with open(self.index_path, "rb") as f:
+            self._imm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._imm
+        if mm[:len(MAGIC)] != MAGIC or mm[-len(MAGIC):] != MAGIC:
+            raise ValueError(f"not a sdlg record index: {self.index_path}")
+        (footer_len,) = struct.unpack("<Q", mm[-len(MAGIC) - 8:-len(MAGIC)])
+        end = len(mm) - len(MAGIC) - 8
+        self.meta = json.loads(mm[end - footer_len:end].decode("utf-8"))
+        self.rows: int = self.meta["rows"]
+
+        size = os.path.getsize(jsonl_path)
+        if size != self.meta["source_size"]:
+            raise ValueError(f"stale index {self.index_path}: indexed {self.meta['source_size']} bytes, "
+                             f"file has {size}; rebuild it with record_index.py --input {jsonl_path}")
+        if size:
+            with open(jsonl_path, "rb") as f:
+                self._dmm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._dmm = b""
+        self._offsets = self._view(self.meta["offsets"])
+        self._id_hashes = self._view(self.meta["ids"]["hashes"])
+        self._id_rows = self._view(self.meta["ids"]["rows"])
+
+    def _view(self, sec):
+        # リトルエンディアン環境ではコピーせず mmap 上の memoryview をそのまま使う
+        code = "Q" if sec["dtype"] == "<u8" else "I"
+        raw = memoryview(self._imm)[sec["offset"]:sec["offset"] + sec["length"]]
+        if sys.byteorder == "little":
+            return raw.cast(code)
+        arr = array(code, raw.tobytes())
+        arr.byteswap()
+        return arr
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        for v in (self._offsets, self._id_hashes, self._id_rows):
+            if isinstance(v, memoryview):
+                v.release()
+        try:
+            self._imm.close()
+        except BufferError:
+            pass  # rows_for() で渡した view がまだ生きている。view と一緒に GC で解放される
+        if isinstance(self._dmm, mmap.mmap):
+            self._dmm.close()
+
+    # ---- 行番号ベース ----
+    def offset(self, row: int) -> int:
+        return self._offsets[row]
+
+    def raw(self, row: int) -> bytes:
+        return self._dmm[self._offsets[row]:self._offsets[row + 1]]
+
+    def record(self, row: int) -> Dict:
+        return json.loads(self.raw(row))
+
+    # ---- id 引き ----
+    def get(self, record_id: str, default=None):
+        h = hash_gram(record_id)
+        i = bisect.bisect_left(self._id_hashes, h)
+        # 64bit ハッシュの衝突に備え、同じハッシュの行は中身の id を確かめる
+        while i < self.rows and self._id_hashes[i] == h:
+            rec = self.record(self._id_rows[i])
+            if rec.get("id") == record_id:
+                return rec
+            i += 1
+        return default
+
+    # ---- 値ごとの postings ----
+    @property
+    def fields(self) -> List[str]:
+        return list(self.meta["postings"])
+
+    def values(self, field: str) -> List[str]:
+        return list(self.meta["postings"][field])
+
+    def rows_for(self, field: str, value: str):
+        sec = self.meta["postings"][field].get(value)
+        return self._view(sec) if sec else array("I")
+
+    def iter_records(self, field: Optional[str] = None, value: Optional[str] = None) -> Iterator[Dict]:
+        rows = range(self.rows) if field is None else self.rows_for(field, value)
+        for row in rows:
+            yield self.record(row)
+
+    def sample(self, field: str, value: str, n: int, rng: random.Random) -> List[Dict]:
+        """field == value の行から n 件（不足なら全件）を非復元で引く。読むのは選んだ行だけ。"""
+        rows = self.rows_for(field, value)
+        picks = rng.sample(range(len(rows)), min(n, len(rows)))
+        out = [self.record(rows[i]) for i in picks]
+        if isinstance(rows, memoryview):
+            rows.release()
+        return out
+
+    def sample_per(self, field: str, n: int, rng: random.Random) -> Dict[str, List[Dict]]:
+        return {v: self.sample(field, v, n, rng) for v in self.values(field)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", required=True, help="Uncompressed JSONL to index")
+    ap.add_argument("--index", help="Index path (default: <input>.idx)")
+    ap.add_argument("--get", help="Print the record with this id instead of (re)building the index")
+    a = ap.parse_args()
+    if a.get:
+        with RecordIndex(a.input, a.index) as idx:
+            rec = idx.get(a.get)
+        if rec is None:
+            sys.exit(f"not found: {a.get}")
+        print(json.dumps(rec, ensure_ascii=False))
+        return
+    n = build_index(a.input, a.index)
+    print(f"Indexed {n} rows -> {a.index or index_path_for(a.input)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Pattern → generator registry for run_generate.
+
+- @register(pattern, ...) で生成関数を1回だけ登録し、build_item は dict 引きで呼び出す
+  （パターンが増えても if/elif を順に比較しない）。未登録のパターンは fallback に回る
+- TemplatePlan はアイテムごとに埋める format テンプレートを登録時に1回だけ (リテラル, フィールド) の組に分解しておく
+"""
+
+from __future__ import annotations
+import keyword
+import os
+import string
+from typing import Callable, Dict, List, Optional
+
+class TemplatePlan:
+    """
+    "{A} vs {B}" 形式のテンプレートを string.Formatter().parse で (直前のリテラル, フィールド名) の組に
+    分解しておき、render(A=..., B=...) はそれを join するだけにしたもの（== template.format(A=..., B=...)）。
+    書式指定・変換・属性参照などを含むテンプレートは str.format のままにする。
+    """
+
+    __slots__ = ("template", "fields", "_pairs", "_tail")
+
+    def __init__(self, template: str):
+        self.template = template
+        self.fields: List[str] = []
+        pairs = []
+        pending = ""  # {{ }} のエスケープは parse がフィールド無しの区切りとして { } に戻して返す
+        for literal, field, spec, conv in string.Formatter().parse(template):
+            if field is None:
+                pending += literal
+                continue
+            if not field.isidentifier() or keyword.iskeyword(field) or spec or conv:
+                pairs = None
+                break
+            pairs.append((pending + literal, field))
+            pending = ""
+            if field not in self.fields:
+                self.fields.append(field)
+        self._pairs = None if pairs is None else tuple(pairs)
+        self._tail = pending
+
+    def render(self, **kw) -> str:
+        # 使わない引数は str.format と同じく無視する
+        pairs = self._pairs
+        if pairs is None:
+            return self.template.format(**kw)
+        return "".join([lit + str(kw[f]) for lit, f in pairs]) + self._tail
+
+    def __reduce__(self):
+        # チェックポイント（スロット次元に入る）では元のテンプレートだけを保存
+        return (TemplatePlan, (self.template,))
+
+    def __repr__(self) -> str:
+        return f"TemplatePlan({self.template!r})"
+
+def compile_plans(templates) -> List[TemplatePlan]:
+    return [TemplatePlan(t) for t in templates]
+
+def _single_slot(topic: str):
+    return [[None]]
+
+class PatternGenerator:
+    """
+    build(r, topic) -> {question_en, answer_en, explanation_ja}
+    space(topic) / from_slot(r, topic, slot) は --sampler slots 用。省略時は組み合わせ1通り（毎回 build）。
+    paraphrase_answer=False なら answer_en はパラフレーズしない（検証キーワード固定の型など）。
+    """
+
+    __slots__ = ("pattern", "build", "space", "from_slot", "paraphrase_answer")
+
+    def __init__(self, pattern: str, build: Callable, space: Optional[Callable] = None,
+                 from_slot: Optional[Callable] = None, paraphrase_answer: bool = True):
+        self.pattern = pattern
+        self.build = build
+        self.space = space or _single_slot
+        self.from_slot = from_slot or (lambda r, topic, slot: build(r, topic))
+        self.paraphrase_answer = paraphrase_answer
+
+def _same_function(a: Callable, b: Callable) -> bool:
+    if a is b:
+        return True
+    ca, cb = getattr(a, "__code__", None), getattr(b, "__code__", None)
+    return (ca is not None and cb is not None and a.__qualname__ == b.__qualname__
+            and ca.co_firstlineno == cb.co_firstlineno
+            # 直接実行とパッケージ経由では co_filename が相対 / 絶対で違うことがある
+            and os.path.realpath(ca.co_filename) == os.path.realpath(cb.co_filename))
+
+class PatternRegistry:
+    def __init__(self, fallback: str = "_fallback"):
+        self.fallback = fallback
+        self._gens: Dict[str, PatternGenerator] = {}
+
+    def register(self, pattern: str, space: Optional[Callable] = None, from_slot: Optional[Callable] = None,
+                 paraphrase_answer: bool = True):
+        def deco(build):
+            old = self._gens.get(pattern)
+            if old is not None:
+                # 同じモジュールが __main__ と sdlg_edu.run_generate の2つの名前で読み込まれたときは
+                # 同じ関数がもう一度来るだけなので何もしない。別の関数が同じ名前を取ろうとしたときだけエラー
+                if _same_function(old.build, build):
+                    return build
+                raise ValueError(f"pattern already registered: {pattern!r}")
+            self._gens[pattern] = PatternGenerator(pattern, build, space, from_slot, paraphrase_answer)
+            return build
+        return deco
+
+    def get(self, pattern: str) -> PatternGenerator:
+        gen = self._gens.get(pattern)
+        return gen if gen is not None else self._gens[self.fallback]
+
+    def __contains__(self, pattern: str) -> bool:
+        return pattern in self._gens
+
+    def patterns(self) -> List[str]:
+        return list(self._gens)
+
+REGISTRY = PatternRegistry()
+register = REGISTRY.register
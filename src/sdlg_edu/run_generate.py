@@ -1,7 +1,15 @@
 import os, sys
-sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
-import argparse, os, json, re, random
-from typing import List, Dict
+if not __package__:  # python src/sdlg_edu/run_generate.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse, functools, os, json, re, random, hashlib, pickle
+from typing import List, Dict, Optional
+
+from sdlg_edu.ngram_index import INDEX_KINDS, make_ngram_index
+from sdlg_edu import fileio, instrument as inst, paraphrase
+from sdlg_edu.record_index import RecordIndexBuilder, build_index, index_path_for
+from sdlg_edu.registry import REGISTRY, TemplatePlan, compile_plans, register
+from sdlg_edu.scheduler import DEFAULT_PATIENCE, DEFAULT_QUEUE_SIZE, run_async
+from sdlg_edu.text_utils import lazy_compile, memo_stats, normalize_text
 
 # === Auto-injected: lightweight paraphrase helpers to reduce 5-gram collisions ===
 try:
@@ -19,18 +27,20 @@ PARA_EN = [
     (r"\bAnswer:\b", ["Solution:", "Response:"]),
 ]
 
+PARA_ENGINE = paraphrase.ParaphraseEngine(PARA_EN)
+
+def configure_paraphrase(rules_path: str = None, mode: str = "compat"):
+    """PARA_EN（+ ルールファイル）から PARA_ENGINE を作り直す。"""
+    global PARA_ENGINE
+    rules = list(PARA_EN)
+    if rules_path:
+        rules += paraphrase.load_rules(rules_path)
+    PARA_ENGINE = paraphrase.ParaphraseEngine(rules, mode=mode)
+
 def _paraphrase_en(r: random.Random, s: str) -> str:
     """Light paraphrase only (conservative)."""
-    if not isinstance(s, str) or not s:
-        return s
-    if len(s) < 40:
-        return s
-    for pat, choices in PARA_EN:
-        if r.random() < 0.6:
-            s = re.sub(pat, r.choice(choices), s)
-    return s
+    return PARA_ENGINE.apply(r, s)
 
-WORD_RE = re.compile(r"[A-Za-z']+")
 
 COLUMNS = ["id","topic","question_en","answer_en","explanation_ja","difficulty","source"]
 
@@ -143,11 +153,6 @@ CONNECT = ["whereas","while","however","but","in contrast"]
 
 # ========= Utilities =========
 
-def normalize_text(s: str) -> str:
-    s = s.replace("’", "'").replace("“","\"").replace("”","\"")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
 def make_id(n: int) -> str:
     return f"GRAM-{n:06d}"
 
@@ -163,7 +168,7 @@ PPARTS = sorted({pp for _, _, pp in VERBS}, key=len, reverse=True)
 
 # 「has/have + (副詞0〜2語) + <既知の過去分詞>」を検出
 _ADVERB_WORD = r"(?:already|just|recently|never|so\s+far)"
-IS_PP_RE = re.compile(
+IS_PP_RE = lazy_compile(
     rf"\b(?:has|have)\s+(?:{_ADVERB_WORD}\s+)?(?:{_ADVERB_WORD}\s+)?(?:{'|'.join(map(re.escape, PPARTS))})\b",
     re.IGNORECASE,
 )
@@ -171,11 +176,37 @@ IS_PP_RE = re.compile(
 def is_present_perfect(s: str) -> bool:
     return bool(IS_PP_RE.search(s or ""))
 # ========= Generators =========
-
-def gen_pp_vs_past(r: random.Random) -> Dict[str,str]:
+# 各生成関数は @register でパターンに1回だけ登録する（build_item は REGISTRY の dict 引き）。
+# アイテムごとに埋めるテンプレートは TemplatePlan に事前コンパイルしておく。
+# --sampler slots 用のスロット空間 (space, from_slot) も同じ登録で渡す。
+
+INSTR_PP_PLANS = compile_plans(INSTR_PP)
+
+# スロット：名前 × (動詞, 補語) × 時の表現 × 副詞 × 指示文
+# 説明文(jp)は 5-gram 判定に効かないのでスロットに含めず、毎回 r から引く。
+def _pp_vs_past_space(topic: str):
+    pairs = []
+    for verb in VERBS:
+        base = verb[0]
+        if base in ("go", "live"):
+            comps = PLACES
+        else:
+            comps = VERB_OBJECT_WHITELIST.get(base, OBJECTS)
+        pairs.extend((verb, c) for c in comps)
+    return [NAMES, pairs, TIME_PHRASES, [None] + ADVERBS, INSTR_PP_PLANS]
+
+def _pp_vs_past_from_slot(r: random.Random, topic: str, slot) -> Dict[str,str]:
+    name, (verb, comp), when, adv, instr = slot
+    return _compose_pp_vs_past(name, verb, comp, when, adv, instr, r.choice(EXPLAIN_PP_VS_PAST_JA))
+
+# PP vs Past は検証キーワード固定のため answer_en をパラフレーズしない
+@register("contrast_present_perfect_vs_past", space=_pp_vs_past_space, from_slot=_pp_vs_past_from_slot,
+          paraphrase_answer=False)
+def gen_pp_vs_past(r: random.Random, topic: str = None) -> Dict[str,str]:
     name = r.choice(NAMES)
     place = r.choice(PLACES)
-    base, past, ppart = r.choice(VERBS)
+    verb = r.choice(VERBS)
+    base = verb[0]
 
     # オブジェクトは動詞と相性の良いものを優先選択
     obj = r.choice(OBJECTS)
@@ -184,18 +215,27 @@ def gen_pp_vs_past(r: random.Random) -> Dict[str,str]:
 
     when = r.choice(TIME_PHRASES)
     adv = r.choice(ADVERBS) if r.random() < 0.6 else None  # 6割で副詞注入
+    instr = r.choice(INSTR_PP_PLANS)
+    jp = r.choice(EXPLAIN_PP_VS_PAST_JA)
+
+    comp = place if base in ("go", "live") else obj
+    return _compose_pp_vs_past(name, verb, comp, when, adv, instr, jp)
+
+def _compose_pp_vs_past(name, verb, comp, when, adv, instr, jp) -> Dict[str,str]:
+    # comp: go/live なら場所、それ以外は目的語
+    base, past, ppart = verb
     use_contraction = False  # 所有格と紛らわしい "Ken's taken" を避ける
 
     # 文の素体
     if base == "go":
-        sent_pp = f"{name} has {ppart} to {place}"
-        sent_past = f"{name} {past} to {place} {when}"
+        sent_pp = f"{name} has {ppart} to {comp}"
+        sent_past = f"{name} {past} to {comp} {when}"
     elif base == "live":
-        sent_pp = f"{name} has {ppart} in {place} for ten years"
-        sent_past = f"{name} {past} in {place} {when}"
+        sent_pp = f"{name} has {ppart} in {comp} for ten years"
+        sent_past = f"{name} {past} in {comp} {when}"
     else:
-        sent_pp = f"{name} has {ppart} {obj}"
-        sent_past = f"{name} {past} {obj} {when}"
+        sent_pp = f"{name} has {ppart} {comp}"
+        sent_past = f"{name} {past} {comp} {when}"
 
     # 副詞を挿入（安全セットのみ）
     if adv and "has " in sent_pp:
@@ -214,8 +254,7 @@ def gen_pp_vs_past(r: random.Random) -> Dict[str,str]:
     # 説明は実際の時制を検知して対応付け（向きの取り違え防止）
     PP, PS = first, second
 
-    instr = r.choice(INSTR_PP)
-    q = instr.format(A=first.rstrip("."), B=second.rstrip("."))
+    q = instr.render(A=first.rstrip("."), B=second.rstrip("."))
 
     # ✅ スクリーナーのキーワードに完全準拠（表現を固定）
     a_en = f"{PP} connects to now; {PS} is detached in time."
@@ -223,65 +262,95 @@ def gen_pp_vs_past(r: random.Random) -> Dict[str,str]:
     # 細かなタイポ抑制
     a_en = a_en.replace(" a a ", " a ")
 
-    jp = r.choice(EXPLAIN_PP_VS_PAST_JA)
-
     return {
         "question_en": normalize_text(q),
         "answer_en":  normalize_text(a_en),
         "explanation_ja": normalize_text(jp)
     }
 
-def gen_articles(r: random.Random) -> Dict[str,str]:
-    ART_INSTR = [
-        "Choose the correct article: '{SENT}'",
-        "Select the best article for the blank: '{SENT}'",
-        "Fill in the blank with an appropriate article: '{SENT}'",
-        "What article fits best here? '{SENT}'"
-    ]
-    patterns = [
-        ("{lead} __ university near my house.", "There is", "a"),
-        ("{lead} __ umbrella because it was raining.", "I bought", "an"),
-        ("Please open __ door, not the window.", None, "the"),
-        ("She is __ engineer and works at a startup.", None, "an"),
-        ("We need __ information before we decide.", None, "(no article)"),
-        ("He found __ old map in the attic.", None, "an"),
-        ("They adopted __ cat from the shelter.", None, "a"),
-        ("Close __ door, please.", None, "the"),
-    ]
-    lead_name = r.choice(NAMES)
-    lead = r.choice([lead_name, "I", "We", "They", "She", "He"])
+ART_INSTR = [
+    "Choose the correct article: '{SENT}'",
+    "Select the best article for the blank: '{SENT}'",
+    "Fill in the blank with an appropriate article: '{SENT}'",
+    "What article fits best here? '{SENT}'"
+]
+
+ART_PATTERNS = [
+    ("{lead} __ university near my house.", "There is", "a"),
+    ("{lead} __ umbrella because it was raining.", "I bought", "an"),
+    ("Please open __ door, not the window.", None, "the"),
+    ("She is __ engineer and works at a startup.", None, "an"),
+    ("We need __ information before we decide.", None, "(no article)"),
+    ("He found __ old map in the attic.", None, "an"),
+    ("They adopted __ cat from the shelter.", None, "a"),
+    ("Close __ door, please.", None, "the"),
+]
+
+ART_ANSWER_TPLS = ["Correct: {ANS}", "Answer: {ANS}"]
+ART_LEADS = ("I", "We", "They", "She", "He")
 
-    sent_tpl, lead_phrase, ans = r.choice(patterns)
-    sent = sent_tpl.format(lead=lead if lead_phrase is None else lead_phrase)
+ART_INSTR_PLANS = compile_plans(ART_INSTR)
+ART_PATTERN_PLANS = [(TemplatePlan(sent), lead, ans) for sent, lead, ans in ART_PATTERNS]
+ART_ANSWER_PLANS = compile_plans(ART_ANSWER_TPLS)
 
-    instr = r.choice(ART_INSTR)
-    tpl_a = "Correct: {ANS}" if r.random() < 0.5 else "Answer: {ANS}"
+# スロット：lead は lead_phrase が固定の文型にしか入らないので文面に効かない → 文型 × 指示文 × 解答形式
+def _articles_space(topic: str):
+    return [ART_PATTERN_PLANS, ART_INSTR_PLANS, ART_ANSWER_PLANS]
+
+def _articles_from_slot(r: random.Random, topic: str, slot) -> Dict[str,str]:
+    pattern, instr, tpl_a = slot
+    return _compose_articles(pattern, None, instr, tpl_a, r.choice(EXPLAIN_ARTICLES_JA))
+
+@register("choose_correct_article", space=_articles_space, from_slot=_articles_from_slot)
+def gen_articles(r: random.Random, topic: str = None) -> Dict[str,str]:
+    lead_name = r.choice(NAMES)
+    lead = r.choice((lead_name,) + ART_LEADS)
+
+    pattern = r.choice(ART_PATTERN_PLANS)
+    instr = r.choice(ART_INSTR_PLANS)
+    tpl_a = ART_ANSWER_PLANS[0] if r.random() < 0.5 else ART_ANSWER_PLANS[1]
     jp = r.choice(EXPLAIN_ARTICLES_JA)
-    q = instr.format(SENT=sent)
-    a_en = tpl_a.format(ANS=ans)
+    return _compose_articles(pattern, lead, instr, tpl_a, jp)
+
+def _compose_articles(pattern, lead, instr, tpl_a, jp) -> Dict[str,str]:
+    sent_tpl, lead_phrase, ans = pattern
+    sent = sent_tpl.render(lead=lead if lead_phrase is None else lead_phrase)
+    q = instr.render(SENT=sent)
+    a_en = tpl_a.render(ANS=ans)
     return {
         "question_en": normalize_text(q),
         "answer_en": normalize_text(a_en),
         "explanation_ja": normalize_text(jp)
     }
 
+FALLBACK_PLANS = [(TemplatePlan(q), TemplatePlan(a), jp) for q, a, jp in TEMPLATES["_fallback"]]
+
+# 専用の生成関数が無いパターン（generic_* など）はすべてここに来る
+@register("_fallback")
 def gen_fallback(r: random.Random, topic: str) -> Dict[str,str]:
-    tpl_q, tpl_a, tpl_jp = TEMPLATES["_fallback"][0]
+    tpl_q, tpl_a, tpl_jp = FALLBACK_PLANS[0]
     sample_answer = f"A sample sentence about {topic}."
     return {
-        "question_en": normalize_text(tpl_q.format(TOPIC=topic)),
-        "answer_en": normalize_text(tpl_a.format(ANS=sample_answer)),
+        "question_en": normalize_text(tpl_q.render(TOPIC=topic)),
+        "answer_en": normalize_text(tpl_a.render(ANS=sample_answer)),
         "explanation_ja": normalize_text(tpl_jp)
     }
 
 def build_item(r: random.Random, idx: int, topic: str, pattern: str) -> Dict[str, str]:
-    if pattern == "contrast_present_perfect_vs_past":
-        base = gen_pp_vs_past(r)
-    elif pattern == "choose_correct_article":
-        base = gen_articles(r)
-    else:
-        base = gen_fallback(r, topic)
+    gen = REGISTRY.get(pattern)
+    return _finish_item(r, gen.build(r, topic), idx, topic, pattern, gen.paraphrase_answer)
+
+def build_items(r: random.Random, idx: int, topic: str, pattern: str, k: int) -> List[Dict[str, str]]:
+    """
+    build_item(r, idx + i, topic, pattern) を i = 0..k-1 で呼ぶのと同じ結果（RNG 消費も同じ）を
+    まとめて返す。パターンの解決は1回だけ。
+    """
+    gen = REGISTRY.get(pattern)
+    build, paraphrase_answer = gen.build, gen.paraphrase_answer
+    return [_finish_item(r, build(r, topic), idx + i, topic, pattern, paraphrase_answer) for i in range(k)]
 
+def _finish_item(r: random.Random, base: Dict[str,str], idx: int, topic: str, pattern: str,
+                 paraphrase_answer: bool = True) -> Dict[str, str]:
     base.update({
         "id": make_id(idx),
         "topic": topic,
@@ -290,98 +359,549 @@ def build_item(r: random.Random, idx: int, topic: str, pattern: str) -> Dict[str
         "source": "synthetic/local"
     })
 
-    # 軽いパラフレーズ（英語のみ）
-    base["question_en"] = _paraphrase_en(r, base.get("question_en", ""))
+    with inst.STATS.timer("paraphrase"):
+        # 軽いパラフレーズ（英語のみ）
+        base["question_en"] = _paraphrase_en(r, base.get("question_en", ""))
 
-    # PP vs Past は検証キーワード固定のためパラフレーズしない
-    if pattern != "contrast_present_perfect_vs_past":
-        base["answer_en"] = _paraphrase_en(r, base.get("answer_en", ""))
-    else:
-        base["answer_en"] = base.get("answer_en", "")
+        # 検証キーワード固定の型（PP vs Past など）は answer_en をパラフレーズしない
+        if paraphrase_answer:
+            base["answer_en"] = _paraphrase_en(r, base.get("answer_en", ""))
+        else:
+            base["answer_en"] = base.get("answer_en", "")
 
 
     return base
 
+# ========= Slot sampler (--sampler slots) =========
+# 文面を決める選択（スロット）の直積を列挙し、非復元で引く。スロット空間は REGISTRY に登録したもの。
+
+def slot_generator(pattern: str):
+    gen = REGISTRY.get(pattern)
+    return gen.space, gen.from_slot
+
+class SlotSampler:
+    """
+    スロット直積 dims[0] × dims[1] × ... から非復元で引く。
+    lazy Fisher–Yates（入れ替えた位置だけ dict に持つ）なのでメモリは引いた数に比例し、
+    remaining が「まだ試していない組み合わせ数」になる。
+    """
+
+    def __init__(self, dims, remaining: Optional[int] = None, swaps: Optional[Dict[int, int]] = None):
+        self.dims = [list(d) for d in dims]
+        self.size = 1
+        for d in self.dims:
+            self.size *= len(d)
+        self.remaining = self.size if remaining is None else remaining
+        self._swaps: Dict[int, int] = dict(swaps or {})
+
+    def state(self) -> Dict:
+        """チェックポイント用の素のデータ。dims は再開時に REGISTRY から作り直す（SlotSampler(dims, **state)）。"""
+        return {"remaining": self.remaining, "swaps": dict(self._swaps)}
+
+    def draw(self, r: random.Random):
+        if self.remaining <= 0:
+            return None
+        last = self.remaining - 1
+        j = r.randrange(self.remaining)
+        v = self._swaps.get(j, j)
+        if j != last:
+            self._swaps[j] = self._swaps.pop(last, last)
+        else:
+            self._swaps.pop(last, None)
+        self.remaining = last
+        # 混合基数で各次元の添字に戻す
+        slot = []
+        for d in reversed(self.dims):
+            v, k = divmod(v, len(d))
+            slot.append(d[k])
+        return tuple(reversed(slot))
+
+def build_item_from_slot(r: random.Random, idx: int, topic: str, pattern: str, slot) -> Dict[str, str]:
+    gen = REGISTRY.get(pattern)
+    return _finish_item(r, gen.from_slot(r, topic, slot), idx, topic, pattern, gen.paraphrase_answer)
+
 # ========= Loader / Dedup =========
 
 def load_recipe(path: str) -> List[Dict[str,str]]:
     items = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            obj = json.loads(line)
-            topic = obj.get("topic","misc")
-            pattern = obj.get("pattern","_fallback")
-            items.append({"topic":topic, "pattern":pattern})
+    for obj in fileio.iter_jsonl(path):
+        spec = {"topic": obj.get("topic","misc"), "pattern": obj.get("pattern","_fallback")}
+        # 任意：件数（--use-recipe-n のとき --n-per-topic の代わり）と優先度（--scheduler async）
+        if obj.get("n") is not None:
+            spec["n"] = int(obj["n"])
+        if obj.get("priority") is not None:
+            spec["priority"] = int(obj["priority"])
+        items.append(spec)
     return items
 
-def get_ngrams(text: str, n: int = 5):
-    toks = [t.lower() for t in WORD_RE.findall(text)]
-    return [' '.join(toks[i:i+n]) for i in range(len(toks)-n+1)]
+def spec_quota(spec: Dict, n_per_topic: int, use_recipe_n: bool = False) -> int:
+    return spec.get("n", n_per_topic) if use_recipe_n else n_per_topic
 
-def build_with_dedup(r: random.Random, idx: int, spec: Dict[str,str], seen_ngrams: set,
+def build_with_dedup(r: random.Random, idx: int, spec: Dict[str,str], seen_ngrams,
                      max_trials: int = 36, max_overlap_ratio: float = 0.02):
     """
     既出5-gramとの重なりが max_overlap_ratio を超えたら再生成。
+    seen_ngrams は ngram_index の索引（grams は索引のキー表現：文字列 or 64-bit ハッシュ）。
     成功時: (item, grams) を返す。失敗時: (None, set())。
     """
-    for _ in range(max_trials):
-        item = build_item(r, idx, spec["topic"], spec["pattern"])
+    stats = inst.STATS
+    for trial in range(1, max_trials + 1):
+        with stats.timer("build"):
+            item = build_item(r, idx, spec["topic"], spec["pattern"])
         blob = (item.get("question_en","") + " " + item.get("answer_en","")).strip()
-        grams = set(get_ngrams(blob, 5))
+        with stats.timer("ngram_keys"):
+            grams = seen_ngrams.text_keys(blob, 5)
         if not grams:
+            stats.observe("trials", trial)
             return item, set()
-        overlap = len(grams & seen_ngrams) / max(1, len(grams))
+        with stats.timer("overlap"):
+            overlap = seen_ngrams.count_hits(grams) / max(1, len(grams))
         if overlap <= max_overlap_ratio:
+            stats.observe("trials", trial)
             return item, grams
+        stats.incr("rejected", topic=spec["topic"])
+    stats.incr("gave_up", topic=spec["topic"])
     return None, set()
 
+def generate_for_spec(r: random.Random, spec: Dict[str,str], n: int, seen_ngrams, idx: int = 1,
+                      max_trials: int = 36, max_overlap_ratio: float = 0.02, progress: Dict = None):
+    """
+    1 spec 分の採用アイテムを (item, grams) として順に返す。
+    seen_ngrams は採用のたびにここで更新する（呼び出し側は書き出しだけ行う）。
+    progress を渡すと {"got", "safety"} をその場で更新する（チェックポイント/再開用）。
+    """
+    progress = {"got": 0, "safety": 0} if progress is None else progress
+    while progress["got"] < n and progress["safety"] < n * 50:
+        progress["safety"] += 1
+        item, grams = build_with_dedup(
+            r=r,
+            idx=idx,
+            spec=spec,
+            seen_ngrams=seen_ngrams,
+            max_trials=max_trials,
+            max_overlap_ratio=max_overlap_ratio
+        )
+        if item is None:
+            continue
+        seen_ngrams |= grams
+        progress["got"] += 1
+        yield item, grams
+        idx += 1
+
+SAMPLERS = ("retry", "slots")
+SCHEDULERS = ("sequential", "async")
+
+def generate_for_spec_slots(r: random.Random, spec: Dict[str,str], n: int, seen_ngrams, idx: int = 1,
+                            max_overlap_ratio: float = 0.02, progress: Dict = None, patience: int = 500,
+                            report: List[Dict] = None):
+    """
+    --sampler slots：スロット直積から非復元で1候補ずつ引き、5-gram 判定に通ったものを返す。
+      - 組み合わせを使い切ったら "exhausted"
+      - patience 回連続で不採用なら "stalled"（残りも既出と重なる見込みが高い）
+    で打ち切り、spec ごとの結果を report に追記する。
+    """
+    progress = {"got": 0, "safety": 0} if progress is None else progress
+    saved = progress.get("sampler")
+    if saved is None or isinstance(saved, dict):
+        # 新規、またはチェックポイントの素のデータ（remaining / swaps）から次元を作り直して再開
+        space, _ = slot_generator(spec["pattern"])
+        progress["sampler"] = SlotSampler(space(spec["topic"]), **(saved or {}))
+        if saved is None:
+            progress["streak"] = 0
+            progress["rejected"] = 0
+    sampler = progress["sampler"]
+    stats = inst.STATS
+    status = "done"
+    while progress["got"] < n:
+        slot = sampler.draw(r)
+        if slot is None:
+            status = "exhausted"
+            break
+        progress["safety"] += 1
+        with stats.timer("build"):
+            item = build_item_from_slot(r, idx, spec["topic"], spec["pattern"], slot)
+        blob = (item.get("question_en","") + " " + item.get("answer_en","")).strip()
+        with stats.timer("ngram_keys"):
+            grams = seen_ngrams.text_keys(blob, 5)
+        with stats.timer("overlap"):
+            rejected = grams and seen_ngrams.count_hits(grams) / len(grams) > max_overlap_ratio
+        if rejected:
+            stats.incr("rejected", topic=spec["topic"])
+            progress["rejected"] += 1
+            progress["streak"] += 1
+            if progress["streak"] >= patience:
+                status = "stalled"
+                break
+            continue
+        stats.observe("trials", progress["streak"] + 1)
+        progress["streak"] = 0
+        seen_ngrams |= grams
+        progress["got"] += 1
+        yield item, grams
+        idx += 1
+    if report is not None:
+        report.append({
+            "topic": spec["topic"], "pattern": spec["pattern"], "requested": n, "got": progress["got"],
+            "space": sampler.size, "tried": progress["safety"], "rejected": progress["rejected"],
+            "status": status,
+        })
+
+def iter_spec_items(r: random.Random, spec: Dict[str,str], n: int, seen_ngrams, idx: int = 1,
+                    opts: Dict = None, progress: Dict = None, report: List[Dict] = None):
+    """opts["sampler"] に応じて retry（従来）/ slots の生成ループを選ぶ。"""
+    opts = opts or {}
+    if opts.get("sampler", "retry") == "slots":
+        return generate_for_spec_slots(r, spec, n, seen_ngrams, idx, progress=progress,
+                                       patience=opts.get("slot_patience", 500), report=report)
+    return generate_for_spec(r, spec, n, seen_ngrams, idx, progress=progress)
+
+def print_slot_report(report: List[Dict]):
+    for row in report:
+        if row["status"] != "done":
+            space = "-" if row["space"] is None else row["space"]
+            tried = "-" if row["tried"] is None else row["tried"]
+            print(f"[{row['status']}] {row['topic']} ({row['pattern']}): {row['got']}/{row['requested']}"
+                  f" | space {space} tried {tried} rejected {row['rejected']}")
+
+# ========= Checkpoint / Resume =========
+
+def checkpoint_path(out_path: str) -> str:
+    return out_path + ".ckpt"
+
+def save_checkpoint(path: str, config: Dict, state: Dict, r: random.Random, seen_ngrams, out_bytes: int):
+    """RNG状態・進捗・n-gram索引・出力バイト数を原子的に保存する（tmp → rename）。"""
+    state = dict(state)
+    if "sampler" in state:
+        # SlotSampler そのもの（__main__ か sdlg_edu.run_generate かで名前が変わる）ではなく素のデータで持つ
+        state["sampler"] = state["sampler"].state()
+    payload = {
+        "version": 2,
+        "config": config,
+        "state": state,
+        "rng_state": r.getstate(),
+        "seen_ngrams": seen_ngrams,
+        "out_bytes": out_bytes,
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def load_checkpoint(path: str) -> Dict:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def seed_from_jsonl(path: str, seen_ngrams):
+    """
+    既存 JSONL の 5-gram を索引に登録し、次に使う idx（既存 id の最大値+1）を返す。
+    --append 用：既存分は再生成しない。
+    """
+    next_idx = 1
+    with fileio.open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            blob = (obj.get("question_en","") + " " + obj.get("answer_en","")).strip()
+            seen_ngrams |= seen_ngrams.text_keys(blob, 5)
+            m = re.match(r"GRAM-(\d+)$", obj.get("id",""))
+            if m:
+                next_idx = max(next_idx, int(m.group(1)) + 1)
+    return next_idx
+
+# ========= Sharding (--workers) =========
+
+def derive_seed(seed: int, shard_no: int) -> int:
+    """(seed, shard番号) から決定的にシャード用シードを導出する。"""
+    h = hashlib.sha256(f"{seed}:{shard_no}".encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big")
+
+def plan_shards(recipe: List[Dict[str,str]], n_per_topic: int, workers: int, use_recipe_n: bool = False):
+    """
+    recipe × 件数をシャードに分割する（use_recipe_n なら行ごとの n を優先）。
+    ワーカー数が recipe 行数より多いときは1 spec を複数シャードに割る。
+    返り値: [(shard_no, spec, quota), ...]（recipe順・決定的）
+    """
+    parts = max(1, -(-workers // max(1, len(recipe))))
+    shards = []
+    for spec in recipe:
+        n = spec_quota(spec, n_per_topic, use_recipe_n)
+        for p in range(parts):
+            quota = n // parts + (1 if p < n % parts else 0)
+            if quota > 0:
+                shards.append((len(shards), spec, quota))
+    return shards
+
+def _run_shard(task):
+    # ワーカープロセス側：シャード内でのみ dedup（id は仮番号、マージ時に振り直す）
+    seed, shard_no, spec, quota, opts = task
+    if opts.get("paraphrase"):
+        configure_paraphrase(**opts["paraphrase"])
+    if opts.get("metrics"):
+        inst.enable(f"generate/shard{shard_no}")
+    r = random.Random(derive_seed(seed, shard_no))
+    report = []
+    items = list(iter_spec_items(r, spec, quota, make_ngram_index(**opts.get("index", {})), opts=opts,
+                                 report=report))
+    # 計測が有効なら試行・棄却の集計を親へ返す（採用数と書き出しは親で数える）
+    snap = inst.STATS.snapshot() if inst.STATS.enabled else None
+    inst.disable()
+    return items, report, snap
+
+def refill_seed(seed: int, shard_no: int) -> int:
+    """シャードの補充（マージで落ちた分の再生成）用シード。シャード本体の系列とは別にする。"""
+    h = hashlib.sha256(f"{seed}:{shard_no}:refill".encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big")
+
+def generate_sharded(seed: int, recipe: List[Dict[str,str]], n_per_topic: int, workers: int,
+                     opts: Dict = None, max_overlap_ratio: float = 0.02, use_recipe_n: bool = False,
+                     report: List[Dict] = None):
+    """
+    シャードを並列生成し、シャード順にシャード横断の5-gram dedup をかけてマージする。
+    横断 dedup で落ちた分は、そのシャードをマージした直後に親プロセスで同じ spec から補充する
+    （全体の索引に対して逐次版と同じ生成ループを回すので、逐次版と同じく打ち切り条件まで粘る）。
+    それでも quota に届かなかったシャードは report に status "short" で残る。
+    出力は (seed, workers) が同じなら常に同一。採用アイテムを順に返す。
+    """
+    shards = plan_shards(recipe, n_per_topic, workers, use_recipe_n)
+    opts = opts or {}
+    stats = inst.STATS
+    tasks = [(seed, shard_no, spec, quota, opts) for shard_no, spec, quota in shards]
+    seen_ngrams = make_ngram_index(**opts.get("index", {}))
+    report = [] if report is None else report
+    dropped_total = refilled_total = 0
+    idx = 1
+    from concurrent.futures import ProcessPoolExecutor  # multiprocessing 一式は並列のときだけ読み込む
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for (shard_no, spec, quota), (result, shard_report, snap) in zip(shards, ex.map(_run_shard, tasks)):
+            if snap is not None:
+                stats.merge_snapshot(snap)
+            got = dropped = 0
+            for item, grams in result:
+                if grams and seen_ngrams.count_hits(grams) / len(grams) > max_overlap_ratio:
+                    dropped += 1
+                    stats.incr("cross_shard_dropped", topic=item["topic"])
+                    continue
+                item["id"] = make_id(idx)
+                seen_ngrams |= grams
+                idx += 1
+                got += 1
+                yield item
+            refill_report = []
+            if got < quota:
+                r = random.Random(refill_seed(seed, shard_no))
+                for item, _ in iter_spec_items(r, spec, quota - got, seen_ngrams, idx, opts, report=refill_report):
+                    item["id"] = make_id(idx)  # iter_spec_items が seen_ngrams を更新済み
+                    idx += 1
+                    got += 1
+                    refilled_total += 1
+                    stats.incr("cross_shard_refilled", topic=item["topic"])
+                    yield item
+            dropped_total += dropped
+            # シャードの報告（slots のみ）と補充分をまとめて、マージ後の結果として1行にする
+            rows = shard_report + refill_report
+            row = {"topic": spec["topic"], "pattern": spec["pattern"], "requested": quota, "got": got,
+                   "space": rows[0]["space"] if rows else None,
+                   # retry sampler のシャードは試行数を報告しないので "-"
+                   "tried": sum(x["tried"] for x in rows) if rows else None,
+                   "rejected": sum(x["rejected"] for x in rows) + dropped,
+                   "status": "done"}
+            if got < quota:
+                row["status"] = "short"
+                stats.incr("undershoot", quota - got, topic=spec["topic"])
+            report.append(row)
+    stats.incr("shards", len(shards))
+    print(f"Shards: {len(shards)} | cross-shard dropped: {dropped_total} | refilled: {refilled_total}",
+          file=sys.stderr)
+
 # ========= Main =========
 
-def main():
-    ap = argparse.ArgumentParser()
+def add_generate_args(ap: argparse.ArgumentParser) -> None:
     ap.add_argument("--recipe", required=True)
     ap.add_argument("--seed", type=int, default=42)
     ap.add_argument("--deterministic", action="store_true")
     ap.add_argument("--outdir", default="outputs")
     ap.add_argument("--n-per-topic", type=int, default=50, help="Generate this many items for each recipe line")
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Shard generation across N processes (output is deterministic per seed and N); "
+                         "with --scheduler async, the size of the candidate-building process pool")
+    ap.add_argument("--ngram-index", choices=INDEX_KINDS, default="set",
+                    help="5-gram dedup index: set (exact), hashed (64-bit open addressing), bloom (fixed memory)")
+    ap.add_argument("--ngram-capacity", type=int, default=1 << 20,
+                    help="Expected number of distinct 5-grams (initial table size / bloom sizing)")
+    ap.add_argument("--bloom-fp", type=float, default=1e-3, help="Target false-positive rate for --ngram-index bloom")
+    ap.add_argument("--novelty-threshold", type=float, default=0.0,
+                    help="Also reject candidates whose MinHash similarity to an accepted item is >= this (0 = off)")
+    ap.add_argument("--checkpoint-every", type=int, default=0,
+                    help="Persist RNG/progress/n-gram index every N written items (0 = off)")
+    ap.add_argument("--resume", action="store_true", help="Continue from the last checkpoint of this outdir")
+    ap.add_argument("--append", action="store_true",
+                    help="Append to an existing output, seeding the dedup index from it")
+    ap.add_argument("--paraphrase-rules", help="Extra paraphrase rules (JSONL of {pattern, choices}) appended to PARA_EN")
+    ap.add_argument("--paraphrase-mode", choices=paraphrase.MODES, default="compat",
+                    help="compat: same RNG use as before / fast: draw only for rules that match")
+    ap.add_argument("--sampler", choices=SAMPLERS, default="retry",
+                    help="retry: rebuild up to 36x per item (legacy) / slots: draw slot combinations without replacement")
+    ap.add_argument("--slot-patience", type=int, default=500,
+                    help="--sampler slots: give up a topic after this many consecutive rejected candidates")
+    ap.add_argument("--use-recipe-n", action="store_true",
+                    help="Take each recipe line's own \"n\" as its item count (--n-per-topic for lines without one)")
+    ap.add_argument("--scheduler", choices=SCHEDULERS, default="sequential",
+                    help="sequential: recipe lines one after another (deterministic) / async: all lines concurrently "
+                         "through a bounded priority queue, candidates built in an executor (order not reproducible)")
+    ap.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                    help="--scheduler async: max candidates waiting for the dedup/writer consumer")
+    ap.add_argument("--async-patience", type=int, default=DEFAULT_PATIENCE,
+                    help="--scheduler async: stop a recipe line after this many consecutive rejected candidates")
+    ap.add_argument("--index", action="store_true",
+                    help="Also write <output>.idx (byte offsets by id + postings by topic/pattern/difficulty)")
+    fileio.add_output_args(ap)
+
+def check_generate_args(ap: argparse.ArgumentParser, args) -> None:
+    if args.resume and args.append:
+        ap.error("--resume and --append are mutually exclusive")
+    sharded = args.workers > 1 and args.scheduler == "sequential"
+    if sharded and (args.resume or args.append or args.checkpoint_every):
+        ap.error("--resume/--append/--checkpoint-every are only supported with --workers 1")
+    if args.compress != "none" and (args.resume or args.checkpoint_every):
+        ap.error("--resume/--checkpoint-every need an uncompressed output (--compress none)")
+    if args.compress != "none" and args.index:
+        ap.error("--index needs an uncompressed output (--compress none)")
+    if args.scheduler == "async" and (args.resume or args.checkpoint_every or args.sampler != "retry"):
+        ap.error("--scheduler async does not support --resume/--checkpoint-every/--sampler slots")
+
+def generate(ap: argparse.ArgumentParser, args, on_item=None) -> Dict:
+    """
+    run_generate の本体。採用アイテムを書き出すたびに on_item(item) を呼ぶ
+    （pipeline.py はここで品質集計と CSV へ流す）。{"path", "rows"} を返す。
+    """
+    index_opts = {"kind": args.ngram_index, "capacity": args.ngram_capacity, "fp_rate": args.bloom_fp}
+    if args.novelty_threshold > 0:
+        index_opts["novelty"] = args.novelty_threshold
+    para_opts = {"rules_path": args.paraphrase_rules, "mode": args.paraphrase_mode}
+    try:
+        configure_paraphrase(**para_opts)
+    except ValueError as e:  # 1パスにまとめられないルール（重複・番号付き後方参照）
+        ap.error(f"--paraphrase-rules: {e}")
+    opts = {"index": index_opts, "paraphrase": para_opts,
+            "sampler": args.sampler, "slot_patience": args.slot_patience}
+    stats = inst.STATS
 
     r = random.Random(args.seed)
     os.makedirs(args.outdir, exist_ok=True)
-    out_path = os.path.join(args.outdir, "english_grammar_qa.jsonl")
+    out_path = fileio.with_compression_suffix(os.path.join(args.outdir, "english_grammar_qa.jsonl"), args.compress)
+    ckpt_path = checkpoint_path(out_path)
 
     recipe = load_recipe(args.recipe)
-    total_written = 0
-    idx = 1
-    seen_ngrams: set = set()
-
-    with open(out_path, "w", encoding="utf-8") as wf:
-        for spec in recipe:
-            got = 0
-            safety = 0
-            while got < args.n_per_topic and safety < args.n_per_topic * 50:
-                safety += 1
-                item, grams = build_with_dedup(
-                    r=r,
-                    idx=idx,
-                    spec=spec,
-                    seen_ngrams=seen_ngrams,
-                    max_trials=36,
-                    max_overlap_ratio=0.02
-                )
-                if item is None:
-                    continue
-                wf.write(json.dumps(item, ensure_ascii=False) + "\n")
-                seen_ngrams |= grams
-                got += 1
-                total_written += 1
-                idx += 1
+    # 再開時に食い違うと決定性が崩れる設定
+    config = {"recipe": os.path.abspath(args.recipe), "seed": args.seed, "n_per_topic": args.n_per_topic,
+              **opts}
+    if args.use_recipe_n:
+        config["use_recipe_n"] = True
+    state = {"spec_pos": 0, "got": 0, "safety": 0, "idx": 1, "total_written": 0}
+    seen_ngrams = make_ngram_index(**index_opts)
+    mode = "w"
+
+    if args.resume:
+        if not os.path.exists(ckpt_path):
+            ap.error(f"no checkpoint to resume: {ckpt_path}")
+        ckpt = load_checkpoint(ckpt_path)
+        if ckpt["config"] != config:
+            ap.error(f"checkpoint was written with different settings: {ckpt['config']}")
+        state = ckpt["state"]
+        r.setstate(ckpt["rng_state"])
+        seen_ngrams = ckpt["seen_ngrams"]
+        # チェックポイント以降に書かれた行は捨てる（再生成で同じ行が出る）
+        with open(out_path, "r+b") as f:
+            f.truncate(ckpt["out_bytes"])
+        mode = "a"
+        print(f"Resumed from checkpoint: {state['total_written']} rows, recipe line {state['spec_pos'] + 1}")
+    elif args.append and os.path.exists(out_path):
+        state["idx"] = seed_from_jsonl(out_path, seen_ngrams)
+        mode = "a"
+
+    # 新規書き出しなら write() のオフセットから索引を作る（追記・再開時は書き終えてから全体を索引し直す）
+    indexer = RecordIndexBuilder() if args.index and mode == "w" else None
+    with fileio.JsonlWriter(out_path, mode, args.compress, **fileio.output_kwargs(args)) as wf:
+
+        def emit(item):
+            with stats.timer("write"):
+                offset = wf.write(item)
+            stats.incr("accepted", topic=item["topic"])
+            stats.tick()
+            if on_item is not None:
+                on_item(item)
+            if indexer is not None:
+                indexer.add(offset, item)
+            state["total_written"] += 1
+
+        if args.scheduler == "async":
+            quotas = [spec_quota(spec, args.n_per_topic, args.use_recipe_n) for spec in recipe]
+            state["slot_report"] = run_async(recipe, quotas, seen_ngrams, emit, build_items, make_id, args.seed,
+                                             args.workers, functools.partial(configure_paraphrase, **para_opts),
+                                             args.queue_size, patience=args.async_patience, idx=state["idx"])
+        elif args.workers > 1:
+            shard_opts = dict(opts, metrics=stats.enabled)
+            for item in generate_sharded(args.seed, recipe, args.n_per_topic, args.workers, shard_opts,
+                                         use_recipe_n=args.use_recipe_n, report=state.setdefault("slot_report", [])):
+                emit(item)
+        else:
+            while state["spec_pos"] < len(recipe):
+                spec = recipe[state["spec_pos"]]
+                n = spec_quota(spec, args.n_per_topic, args.use_recipe_n)
+                for item, _ in iter_spec_items(r, spec, n, seen_ngrams, state["idx"], opts,
+                                               progress=state, report=state.setdefault("slot_report", [])):
+                    emit(item)
+                    state["idx"] += 1
+                    if args.checkpoint_every and state["total_written"] % args.checkpoint_every == 0:
+                        wf.flush()
+                        save_checkpoint(ckpt_path, config, state, r, seen_ngrams, wf.tell())
+                state["spec_pos"] += 1
+                state["got"] = 0
+                state["safety"] = 0
+                for k in ("sampler", "streak", "rejected"):
+                    state.pop(k, None)
+
+    index_path = index_path_for(out_path)
+    if indexer is not None:
+        indexer.write(index_path, wf.tell())
+    elif args.index:
+        build_index(out_path, index_path)
+    elif os.path.exists(index_path):
+        # 書き換えた出力に古い索引を残さない
+        os.remove(index_path)
+
+    # 完走したら古いチェックポイントで再開しないよう消す
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    total_written = state["total_written"]
+    print_slot_report(state.get("slot_report", []))
 
     print(f"Saved: {out_path}  ({total_written} rows)")
+    if args.index:
+        print(f"Index: {index_path}")
+    if args.novelty_threshold > 0 and args.workers == 1:
+        print(f"Near-duplicate rejections (MinHash >= {args.novelty_threshold}): {seen_ngrams.rejected}")
     print("Recipe lines:", len(recipe), "| per-topic:", args.n_per_topic)
+    if stats.enabled:
+        # このプロセスの normalize_text memo（--workers > 1 ならシャード側の分は入らない）
+        memo = memo_stats()["normalize_text"]
+        stats.incr("normalize_memo_hits", memo["hits"])
+        stats.incr("normalize_memo_misses", memo["misses"])
+    return {"path": out_path, "rows": total_written}
+
+def main():
+    ap = argparse.ArgumentParser()
+    add_generate_args(ap)
+    inst.add_metrics_args(ap)
+    args = ap.parse_args()
+    check_generate_args(ap, args)
+    inst.setup("generate", args)
+    generate(ap, args)
+    inst.finish(args)
+    if args.metrics_out:
+        print(f"Metrics: {args.metrics_out}")
 
 if __name__ == "__main__":
     main()
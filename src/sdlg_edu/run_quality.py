@@ -1,16 +1,21 @@
-import argparse, json, os, re
-from collections import Counter
+import os, sys
+if not __package__:  # python src/sdlg_edu/run_quality.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse, hashlib, json, pickle, re
+
+from sdlg_edu import fileio, instrument as inst
+from sdlg_edu.minhash import DEFAULT_PERMS, DEFAULT_THRESHOLD, NearDupDetector
+from sdlg_edu.ngrams import DistinctHashes, get_ngrams, ngram_hashes_batch
+from sdlg_edu.sketches import HyperLogLog, SpaceSaving
+from sdlg_edu.text_utils import lazy_compile, trie_pattern
 
 # -------------------------------
 # Heuristics (no extra packages)
 # -------------------------------
 
 # ざっくり英語/日本語の判定
-RE_LATIN = re.compile(r'[A-Za-z]')
-RE_JP    = re.compile(r'[\u3040-\u30FF\u4E00-\u9FFF]')
-
-# 簡易トキナイズ（英語想定）
-WORD_RE = re.compile(r"[A-Za-z']+")
+RE_LATIN = lazy_compile(r'[A-Za-z]')
+RE_JP    = lazy_compile(r'[\u3040-\u30FF\u4E00-\u9FFF]')
 
 # 毒性ワードの超小規模辞書（必要に応じて拡張）
 TOXIC_WORDS = {
@@ -19,17 +24,19 @@ TOXIC_WORDS = {
 }
 
 # PII 検知の簡易版
-RE_EMAIL = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}')
-RE_PHONE = re.compile(r'(?:\+?\d[\s-]?)?(?:\(?\d{2,4}\)?[\s-]?)?\d{3,4}[\s-]?\d{3,4}')
-RE_ADDR_HINT = re.compile(r'\d{3}-\d{4}')  # 郵便番号っぽい
+RE_EMAIL = lazy_compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}')
+RE_PHONE = lazy_compile(r'(?:\+?\d[\s-]?)?(?:\(?\d{2,4}\)?[\s-]?)?\d{3,4}[\s-]?\d{3,4}')
+RE_ADDR_HINT = lazy_compile(r'\d{3}-\d{4}')  # 郵便番号っぽい
+
+PII_PATTERNS = {"email": RE_EMAIL, "phone": RE_PHONE, "addr": RE_ADDR_HINT}
 
 def read_jsonl(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            yield json.loads(line)
+    # .gz / .bz2 / .xz などは拡張子から判定して透過的に展開。チャンク単位でまとめてデコード
+    return fileio.iter_jsonl(path)
+
+def read_jsonl_range(path, start, end):
+    # [start, end) に行頭がある行だけを読む（start は行頭であること）
+    return fileio.iter_jsonl(path, start=start, end=end)
 
 def has_english(s: str) -> bool:
     return bool(RE_LATIN.search(s))
@@ -44,56 +51,347 @@ def language_ok(item) -> bool:
     e_ok = has_japanese(item.get("explanation_ja",""))
     return q_ok and a_ok and e_ok
 
-def get_ngrams(text: str, n: int = 5):
-    toks = [t.lower() for t in WORD_RE.findall(text)]
-    return [' '.join(toks[i:i+n]) for i in range(len(toks)-n+1)]
+def language_failures(item):
+    """language_ok を満たさないフィールド名のリスト（診断用）。"""
+    bad = []
+    for key in ("question_en", "answer_en"):
+        s = item.get(key, "")
+        if not has_english(s) or has_japanese(s):
+            bad.append(key)
+    if not has_japanese(item.get("explanation_ja", "")):
+        bad.append("explanation_ja")
+    return bad
+
+# -------------------------------
+# Scanner: 毒性語彙 + PII を1本の正規表現で1パス走査
+# -------------------------------
+
+def load_lexicon(path):
+    """1行1語の語彙ファイルを読む（空行・# コメントは無視）。"""
+    words = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            w = line.split('#', 1)[0].strip()
+            if w:
+                words.add(w)
+    return words
+
+class Scanner:
+    """
+    毒性語彙（部分一致・大小無視）と PII パターンを名前付きグループの1本の alternation にまとめ、
+    scan() でレコード中のヒットカテゴリ（"toxic" / "email" / "phone" / "addr"）を1パスで返す。
+    同じ位置で先の分岐に隠れたカテゴリは、何かヒットした稀なレコードだけ個別パターンで確認する。
+    """
+
+    def __init__(self, lexicon=None, pii_patterns=None):
+        lexicon = TOXIC_WORDS if lexicon is None else lexicon
+        pii_patterns = PII_PATTERNS if pii_patterns is None else pii_patterns
+        self.lexicon = tuple(sorted({w.lower() for w in lexicon if w}))
+        self.patterns = {}
+        parts = []
+        if self.lexicon:
+            tox = trie_pattern(self.lexicon)
+            self.patterns["toxic"] = re.compile(tox, re.IGNORECASE)
+            parts.append(f"(?P<toxic>(?i:{tox}))")
+        for name, rx in pii_patterns.items():
+            self.patterns[name] = rx
+            parts.append(f"(?P<{name}>{rx.pattern})")
+        self.regex = re.compile('|'.join(parts)) if parts else None
+
+    def scan(self, text: str) -> set:
+        if self.regex is None:
+            return set()
+        hits = {m.lastgroup for m in self.regex.finditer(text)}
+        if hits:
+            for name, rx in self.patterns.items():
+                if name not in hits and rx.search(text):
+                    hits.add(name)
+        return hits
+
+    def explain(self, text: str) -> list:
+        """ヒットの理由コード（"toxic:<語>" / "pii:<種類>"）。scan() が何か返した稀なレコードだけに使う。"""
+        codes = set()
+        for name, rx in self.patterns.items():
+            if name == "toxic":
+                codes.update(f"toxic:{m.group(0).lower()}" for m in rx.finditer(text))
+            elif rx.search(text):
+                codes.add(f"pii:{name}")
+        return sorted(codes)
+
+_SCANNERS = {}
+
+def get_scanner(lexicon=None) -> Scanner:
+    # 語彙ごとにコンパイル済み Scanner を使い回す
+    key = None if lexicon is None else frozenset(lexicon)
+    if key not in _SCANNERS:
+        _SCANNERS[key] = Scanner(lexicon)
+    return _SCANNERS[key]
 
 def toxicity_hit(text: str) -> bool:
-    low = text.lower()
-    return any(w in low for w in TOXIC_WORDS)
+    return "toxic" in get_scanner().scan(text)
 
 def pii_hit(text: str) -> bool:
-    return bool(RE_EMAIL.search(text) or RE_PHONE.search(text) or RE_ADDR_HINT.search(text))
+    return bool(get_scanner().scan(text) & PII_PATTERNS.keys())
+
+DUP_MODES = ("exact", "hll", "hashed")
+HASH_BATCH = 4096
+DUP_RECORD_RATIO = 0.02  # 診断でレコード単位の重複とみなす割合（ゲートの dup_5gram_rate と同じ基準）
+TOP_NGRAMS = 20
+
+class QualityAccumulator:
+    """
+    品質指標を1件ずつ add() で逐次集計する（コーパス全体をメモリに載せない）。
+    dup_5gram_rate = (5-gram 総数 - distinct 数) / 5-gram 総数 なので、保持するのは distinct 集合だけでよい。
+      exact : distinct 5-gram を set で保持（従来と同じ値・メモリは distinct 数に比例）
+      hll   : HyperLogLog で distinct 数を推定（メモリ固定 2**p byte、誤差は sketches.HyperLogLog 参照）
+      hashed: 5-gram を文字列にせず 64-bit ハッシュ（ngrams.ngram_hashes_batch）にして HASH_BATCH 件ずつまとめて計算し、
+              distinct 数は ngrams.DistinctHashes（NumPy ならソートで重複を畳む）で数える。
+              値は exact と同じ（64-bit ハッシュが衝突しない限り）
+    diagnose=True なら add() が違反の理由コードのリストを返し、理由ごとの件数と
+    頻出 5-gram（sketches.SpaceSaving）も同じパスで集める。レコード単位の重複（"dup_5gram:<既出>/<総数>"）は
+    それまでの distinct 集合と比べるので exact のときだけ。
+    """
+
+    def __init__(self, dup_mode: str = "exact", hll_precision: int = 16, lexicon=None, near_dup=None,
+                 diagnose: bool = False):
+        if dup_mode not in DUP_MODES:
+            raise ValueError(f"unknown dup mode: {dup_mode!r}")
+        self.dup_mode = dup_mode
+        self.lexicon = lexicon
+        self.scanner = get_scanner(lexicon)
+        self.total = 0
+        self.lang_ok = 0
+        self.tox_hits = 0
+        self.pii_hits = 0
+        self.ngram_total = 0
+        if dup_mode == "exact":
+            self.distinct = set()
+        elif dup_mode == "hll":
+            self.distinct = HyperLogLog(hll_precision)
+        else:
+            self.distinct = DistinctHashes()
+        self._blobs = []  # hashed: まだハッシュしていない本文
+        # near_dup: {"threshold", "num_perm"} を渡すと MinHash/LSH の近似重複も数える
+        self.near = NearDupDetector(**near_dup) if near_dup else None
+        self.diagnose = diagnose
+        self.flagged = 0
+        self.reason_counts = {}
+        self.heavy = SpaceSaving() if diagnose else None
 
-def summarize_quality(items):
-    total = len(items)
+    def add(self, x) -> list:
+        stats = inst.STATS
+        self.total += 1
+        topic = x.get('topic')
 
-    # language
-    lang_ok = sum(1 for x in items if language_ok(x))
-    language_match = (lang_ok / total) if total else 0.0
+        # language
+        with stats.timer("language"):
+            ok = language_ok(x)
+        reasons = []
+        if ok:
+            self.lang_ok += 1
+        else:
+            stats.incr("language_fail", topic=topic)
+            if self.diagnose:
+                reasons.extend(f"language:{k}" for k in language_failures(x))
 
-    # dup 5-gram
-    all_ngrams = []
-    for x in items:
+        # dup 5-gram
         blob = ' '.join([
             x.get('question_en',''),
             x.get('answer_en',''),
             #x.get('explanation_ja',''),
         ])
-        all_ngrams.extend(get_ngrams(blob, 5))
-    dup_rate = 0.0
-    if all_ngrams:
-        c = Counter(all_ngrams)
-        dup_count = sum(v-1 for v in c.values() if v > 1)
-        dup_rate = dup_count / max(1, len(all_ngrams))
-
-    # toxicity / pii
-    tox_hits = 0
-    pii_hits = 0
-    for x in items:
+        if self.dup_mode == "hashed":
+            self._blobs.append(blob)
+            if len(self._blobs) >= HASH_BATCH:
+                self._flush_hashes()
+            if self.diagnose:
+                with stats.timer("heavy"):
+                    self.heavy.update(get_ngrams(blob, 5))
+        else:
+            with stats.timer("dup"):
+                grams = get_ngrams(blob, 5)
+                self.ngram_total += len(grams)
+                if self.diagnose and self.dup_mode == "exact":
+                    before = len(self.distinct)
+                    self.distinct.update(grams)
+                    seen = len(grams) - (len(self.distinct) - before)
+                    if grams and seen / len(grams) > DUP_RECORD_RATIO:
+                        reasons.append(f"dup_5gram:{seen}/{len(grams)}")
+                else:
+                    self.distinct.update(grams)
+            if self.diagnose:
+                with stats.timer("heavy"):
+                    self.heavy.update(grams)
+
+        # near-duplicate（5-gram と同じ question + answer）
+        if self.near is not None:
+            with stats.timer("near_dup"):
+                self.near.add(x.get('id') or f"#{self.total}", blob)
+
+        # toxicity / pii
         blob = ' '.join([x.get('question_en',''), x.get('answer_en',''), x.get('explanation_ja','')])
-        if toxicity_hit(blob): tox_hits += 1
-        if pii_hit(blob):      pii_hits += 1
-    toxicity_rate = tox_hits / total if total else 0.0
-    pii_rate      = pii_hits  / total if total else 0.0
-
-    return {
-        "count": total,
-        "language_match": round(language_match, 4),
-        "dup_5gram_rate": round(dup_rate, 4),
-        "toxicity_rate":  round(toxicity_rate, 4),
-        "pii_rate":       round(pii_rate, 4),
-    }
+        with stats.timer("scan"):
+            hits = self.scanner.scan(blob)
+        if "toxic" in hits:
+            self.tox_hits += 1
+            stats.incr("toxic", topic=topic)
+        if hits & PII_PATTERNS.keys():
+            self.pii_hits += 1
+            stats.incr("pii", topic=topic)
+        if hits and self.diagnose:
+            reasons.extend(self.scanner.explain(blob))
+
+        if reasons:
+            self.flagged += 1
+            rc = self.reason_counts
+            for code in reasons:
+                key = "dup_5gram" if code.startswith("dup_5gram:") else code
+                rc[key] = rc.get(key, 0) + 1
+        return reasons
+
+    def _flush_hashes(self) -> None:
+        if self._blobs:
+            with inst.STATS.timer("dup"):
+                hashes = ngram_hashes_batch(self._blobs, 5)
+                self._blobs = []
+                self.ngram_total += len(hashes)
+                self.distinct.update(hashes)
+
+    def update(self, items, sink=None) -> "QualityAccumulator":
+        """
+        items を順に add() する。sink を渡すと items は (バイト位置, レコード) の組で、
+        違反があったレコードごとに sink(id, バイト位置, 理由コードのリスト) を呼ぶ（diagnose=True のとき）。
+        """
+        tick = inst.STATS.tick
+        if sink is None:
+            for x in items:
+                self.add(x)
+                tick()
+        else:
+            add = self.add
+            for offset, x in items:
+                reasons = add(x)
+                if reasons:
+                    sink(x.get('id'), offset, reasons)
+                tick()
+        return self
+
+    def __getstate__(self):
+        # ワーカーから返すときにコンパイル済み Scanner は送らない
+        self._flush_hashes()
+        state = self.__dict__.copy()
+        state.pop("scanner", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "diagnose" not in state:  # diagnose 追加前に保存された state
+            self.diagnose, self.flagged, self.reason_counts, self.heavy = False, 0, {}, None
+        self.scanner = get_scanner(state.get("lexicon"))
+
+    def merge(self, other: "QualityAccumulator") -> "QualityAccumulator":
+        """別チャンクの部分集計を足し込む（dup_mode / hll_precision が同じこと）。"""
+        if other.dup_mode != self.dup_mode:
+            raise ValueError("cannot merge accumulators with different dup modes")
+        self._flush_hashes()
+        other._flush_hashes()
+        self.total       += other.total
+        self.lang_ok     += other.lang_ok
+        self.tox_hits    += other.tox_hits
+        self.pii_hits    += other.pii_hits
+        self.ngram_total += other.ngram_total
+        if self.dup_mode == "exact":
+            self.distinct |= other.distinct
+        else:
+            self.distinct.merge(other.distinct)
+        if self.near is not None:
+            self.near.merge(other.near)
+        if self.diagnose:
+            self.flagged += other.flagged
+            for k, v in other.reason_counts.items():
+                self.reason_counts[k] = self.reason_counts.get(k, 0) + v
+            self.heavy.merge(other.heavy)
+        return self
+
+    def metrics(self):
+        self._flush_hashes()
+        total = self.total
+        language_match = (self.lang_ok / total) if total else 0.0
+        dup_rate = 0.0
+        if self.ngram_total:
+            dup_count = max(0, self.ngram_total - len(self.distinct))
+            dup_rate = dup_count / max(1, self.ngram_total)
+        toxicity_rate = self.tox_hits / total if total else 0.0
+        pii_rate      = self.pii_hits  / total if total else 0.0
+
+        out = {
+            "count": total,
+            "language_match": round(language_match, 4),
+            "dup_5gram_rate": round(dup_rate, 4),
+            "toxicity_rate":  round(toxicity_rate, 4),
+            "pii_rate":       round(pii_rate, 4),
+        }
+        if self.near is not None:
+            out["near_dup_rate"] = round(self.near.rate(), 4)
+        return out
+
+    def near_dup_clusters(self, limit: int = 100):
+        """近似重複クラスタ（大きい順に limit 件）。--near-dup のときだけ。"""
+        clusters = self.near.clusters()
+        return {"count": len(clusters), "clusters": clusters[:limit]}
+
+    def violation_summary(self, top: int = TOP_NGRAMS):
+        """理由ごとの件数と、2回以上出た頻出 5-gram（count は過大側の推定、error はその最大誤差）。diagnose のときだけ。"""
+        grams = [{"ngram": g, "count": c, "error": e} for g, c, e in self.heavy.top(top) if c > 1]
+        return {"records": self.flagged, "reasons": dict(sorted(self.reason_counts.items())),
+                "top_dup_ngrams": grams}
+
+def summarize_quality(items, dup_mode: str = "exact", hll_precision: int = 16, lexicon=None, near_dup=None):
+    # items は list でもジェネレータでもよい（1パスで集計）
+    return QualityAccumulator(dup_mode, hll_precision, lexicon, near_dup).update(items).metrics()
+
+def _scan_range(task):
+    # ワーカープロセス側：1チャンク分の部分集計（と計測が有効ならその snapshot、diagnose なら違反行）を返す
+    path, start, end, dup_mode, hll_precision, lexicon, near_dup, diagnose, metrics = task
+    if metrics:
+        inst.enable(f"quality/{start}")
+    acc = QualityAccumulator(dup_mode, hll_precision, lexicon, near_dup, diagnose)
+    rows = []
+    if diagnose:
+        acc.update(fileio.iter_jsonl(path, start=start, end=end, offsets=True),
+                   lambda *row: rows.append(row))
+    else:
+        acc.update(read_jsonl_range(path, start, end))
+    acc._flush_hashes()
+    snap = inst.STATS.snapshot() if inst.STATS.enabled else None
+    inst.disable()
+    return acc, snap, rows
+
+def collect_quality_parallel(path, workers, dup_mode: str = "exact", hll_precision: int = 16, lexicon=None,
+                             near_dup=None, diagnose: bool = False, sink=None) -> QualityAccumulator:
+    """
+    入力を行境界でバイト分割し、チャンクごとの部分集計をプロセスプールで作って合算する。
+    diagnose のとき sink にはチャンク順（＝ファイル順）に違反行を渡す。レコード単位の dup_5gram は
+    チャンク内で既出かどうかだけを見る（チャンクをまたぐ重複は集計値にだけ効く）。
+    """
+    tasks = [(path, a, b, dup_mode, hll_precision, lexicon, near_dup, diagnose, inst.STATS.enabled)
+             for a, b in fileio.split_line_ranges(path, workers)]
+    acc = QualityAccumulator(dup_mode, hll_precision, lexicon, near_dup, diagnose)
+    from concurrent.futures import ProcessPoolExecutor  # multiprocessing 一式は並列のときだけ読み込む
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for part, snap, rows in ex.map(_scan_range, tasks):
+            if snap is not None:
+                inst.STATS.merge_snapshot(snap)
+            with inst.STATS.timer("merge"):
+                acc.merge(part)
+            if sink is not None:
+                for row in rows:
+                    sink(*row)
+    return acc
+
+def summarize_quality_parallel(path, workers, dup_mode: str = "exact", hll_precision: int = 16, lexicon=None,
+                               near_dup=None):
+    return collect_quality_parallel(path, workers, dup_mode, hll_precision, lexicon, near_dup).metrics()
 
 def gate_pass(metrics):
     # RUN_MANIFEST.md の基準
@@ -113,28 +411,199 @@ def write_markdown(path, m, passed):
     lines.append(f"- dup_5gram_rate: **{m['dup_5gram_rate']}** (<= 0.02)")
     lines.append(f"- toxicity_rate: **{m['toxicity_rate']}** (= 0.00)")
     lines.append(f"- pii_rate: **{m['pii_rate']}** (= 0.00)")
+    if "near_dup_rate" in m:
+        lines.append(f"- near_dup_rate: **{m['near_dup_rate']}** (MinHash/LSH, informational)")
     lines.append("")
     lines.append(f"**PASS:** {'✅' if passed else '❌'}")
     with open(path, 'w', encoding='utf-8') as f:
         f.write('\n'.join(lines))
 
+def add_quality_args(ap: argparse.ArgumentParser) -> None:
+    # 集計方法のオプション（入出力パスは各 CLI 側で持つ）
+    ap.add_argument("--dup-mode", choices=DUP_MODES, default="exact",
+                    help="exact: distinct 5-gram set / hll: fixed-memory HyperLogLog estimate / "
+                         "hashed: batched 64-bit n-gram hashes, sort-based distinct count (NumPy optional)")
+    ap.add_argument("--hll-precision", type=int, default=16, help="HyperLogLog registers = 2**p (std err ~1.04/sqrt(2**p))")
+    ap.add_argument("--lexicon", action="append", default=[],
+                    help="Extra toxic-term file (one term per line); may be given more than once")
+    ap.add_argument("--near-dup", action="store_true",
+                    help="Also report MinHash/LSH near-duplicates (near_dup_rate + clusters in the JSON report)")
+    ap.add_argument("--near-dup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="Estimated Jaccard similarity (word 3-gram shingles) that counts as a near-duplicate")
+    ap.add_argument("--minhash-perms", type=int, default=DEFAULT_PERMS, help="MinHash signature length")
+
+def quality_options(args):
+    """add_quality_args のオプション → QualityAccumulator / collect_quality_parallel のキーワード引数。"""
+    lexicon = None
+    if args.lexicon:
+        lexicon = set(TOXIC_WORDS)
+        for path in args.lexicon:
+            lexicon |= load_lexicon(path)
+    near_dup = {"threshold": args.near_dup_threshold, "num_perm": args.minhash_perms} if args.near_dup else None
+    return {"dup_mode": args.dup_mode, "hll_precision": args.hll_precision, "lexicon": lexicon, "near_dup": near_dup}
+
+def write_reports(acc: QualityAccumulator, out_json: str, out_md: str, violations_path=None):
+    """quality.json / quality_summary.md を書き、(metrics, passed) を返す。"""
+    with inst.STATS.timer("finalize"):
+        metrics = acc.metrics()
+    passed = gate_pass(metrics)
+
+    report = {"metrics": metrics, "pass": passed}
+    if acc.near is not None:
+        report["near_dup"] = acc.near_dup_clusters()
+    if acc.diagnose:
+        report["violations"] = {"path": violations_path, **acc.violation_summary()}
+    os.makedirs(os.path.dirname(out_json), exist_ok=True)
+    with open(out_json, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    write_markdown(out_md, metrics, passed)
+    return metrics, passed
+
+# -------------------------------
+# Incremental state (--delta)
+# -------------------------------
+# 集計途中の QualityAccumulator（件数・5-gram の distinct 構造・近似重複の署名）を
+# quality.json の隣に保存し、次回は前回読み終えたバイト位置から後ろだけを足し込む。
+# 入力が追記されただけであることは、読み終えた位置の直前 FINGERPRINT_BYTES の sha256 で確かめる。
+
+STATE_VERSION = 1
+FINGERPRINT_BYTES = 4096
+
+def state_path_for(out_json: str) -> str:
+    return os.path.splitext(out_json)[0] + ".state"
+
+def _fingerprint(path: str, offset: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        return hashlib.sha256(f.read(offset - max(0, offset - FINGERPRINT_BYTES))).hexdigest()
+
+def complete_lines_end(path: str) -> int:
+    """最後の改行の直後の位置（書きかけの最終行は次回に回す）。"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            start = max(0, pos - (1 << 16))
+            f.seek(start)
+            cut = f.read(pos - start).rfind(b"\n")
+            if cut >= 0:
+                return start + cut + 1
+            pos = start
+    return 0
+
+def is_line_start(path: str, offset: int) -> bool:
+    if offset == 0:
+        return True
+    with open(path, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
+
+def load_state(path: str, input_path: str, opts):
+    """保存済み state を読み、同じ入力・同じ集計オプションで、入力が追記だけであることを確かめる。"""
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != STATE_VERSION:
+        raise ValueError(f"unsupported quality state version in {path}")
+    if state["input"] != os.path.abspath(input_path):
+        raise ValueError(f"{path} was built from {state['input']}, not {os.path.abspath(input_path)}")
+    if state["options"] != opts:
+        raise ValueError(f"{path} was built with different options: {state['options']}")
+    offset = state["offset"]
+    if os.path.getsize(input_path) < offset or _fingerprint(input_path, offset) != state["fingerprint"]:
+        raise ValueError(f"{input_path} changed before offset {offset} (not an append); rerun without --delta")
+    return state
+
+def save_state(path: str, acc: QualityAccumulator, input_path: str, offset: int, opts) -> None:
+    state = {"version": STATE_VERSION, "input": os.path.abspath(input_path), "options": opts,
+             "offset": offset, "fingerprint": _fingerprint(input_path, offset), "acc": acc}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True)
     ap.add_argument("--out_json", required=True)
     ap.add_argument("--out_md", required=True)
+    ap.add_argument("--workers", type=int, default=1, help="Scan byte-range chunks of the input in N processes")
+    ap.add_argument("--delta", action="store_true",
+                    help="Fold only records appended since the last --delta run into the saved state "
+                         "(full scan + save when there is no state yet)")
+    ap.add_argument("--since-offset", type=int,
+                    help="With --delta: start reading at this byte offset (a line start) instead of the saved one")
+    ap.add_argument("--state", help="Incremental state file (default: <out_json without .json>.state)")
+    ap.add_argument("--violations",
+                    help="Write one JSONL row {id, offset, reasons} per offending record to this file, in the same pass "
+                         "(appended to on --delta runs); reason counts and top duplicate 5-grams go to the JSON report")
+    add_quality_args(ap)
+    inst.add_metrics_args(ap)
     args = ap.parse_args()
+    if args.since_offset is not None and not args.delta:
+        ap.error("--since-offset needs --delta")
+    if args.delta and fileio.compression_from_path(args.input) != "none":
+        ap.error("--delta needs an uncompressed input (byte offsets)")
+    if args.delta and args.workers > 1:
+        ap.error("--workers is not supported with --delta (the appended range is scanned in one process)")
+    inst.setup("quality", args)
 
-    items = list(read_jsonl(args.input))
-    metrics = summarize_quality(items)
-    passed = gate_pass(metrics)
+    opts = quality_options(args)
+    if args.violations:
+        opts["diagnose"] = True
+    state_path = args.state or state_path_for(args.out_json)
+    resuming = args.delta and os.path.exists(state_path)
+    if args.delta and not resuming and args.since_offset is not None:
+        ap.error(f"no saved state at {state_path} to resume from --since-offset")
+    vio = sink = None
+    if args.violations:
+        os.makedirs(os.path.dirname(os.path.abspath(args.violations)), exist_ok=True)
+        vio = fileio.JsonlWriter(args.violations, "a" if resuming else "w")
+        sink = lambda rid, offset, reasons: vio.write({"id": rid, "offset": offset, "reasons": reasons})
+
+    def scan(acc, start=0, end=None):
+        if sink is not None:
+            return acc.update(fileio.iter_jsonl(args.input, start=start, end=end, offsets=True), sink)
+        if start or end is not None:
+            return acc.update(read_jsonl_range(args.input, start, end))
+        return acc.update(read_jsonl(args.input))
 
-    os.makedirs(os.path.dirname(args.out_json), exist_ok=True)
-    with open(args.out_json, 'w', encoding='utf-8') as f:
-        json.dump({"metrics": metrics, "pass": passed}, f, ensure_ascii=False, indent=2)
-    write_markdown(args.out_md, metrics, passed)
+    acc = None
+    if resuming:
+        try:
+            state = load_state(state_path, args.input, opts)
+        except ValueError as e:
+            ap.error(str(e))
+        acc, start = state["acc"], state["offset"]
+        end = complete_lines_end(args.input)
+        if args.since_offset is not None:
+            if args.since_offset < start:
+                ap.error(f"--since-offset {args.since_offset} is before the saved offset {start} (would double count)")
+            if args.since_offset > end:
+                ap.error(f"--since-offset {args.since_offset} is past the last complete line (byte {end})")
+            if not is_line_start(args.input, args.since_offset):
+                ap.error(f"--since-offset {args.since_offset} is not at the start of a line")
+            start = args.since_offset
+        before = acc.total
+        if end > start:
+            scan(acc, start, end)
+        print(f"Delta: {acc.total - before} new records (bytes {start}..{end})", file=sys.stderr)
+    elif args.delta:
+        end = complete_lines_end(args.input)
+    if acc is None:
+        if args.workers > 1 and fileio.compression_from_path(args.input) == "none" and not args.delta:
+            acc = collect_quality_parallel(args.input, args.workers, sink=sink, **opts)
+        elif args.delta:
+            acc = scan(QualityAccumulator(**opts), 0, end)
+        else:
+            acc = scan(QualityAccumulator(**opts))
+    if vio is not None:
+        vio.close()
+    metrics, passed = write_reports(acc, args.out_json, args.out_md, args.violations)
+    if args.delta:
+        save_state(state_path, acc, args.input, end, opts)
 
     print(json.dumps({"metrics": metrics, "pass": passed}, ensure_ascii=False))
+    inst.finish(args)
     if not passed:
         # 失敗時は非0終了（パイプラインでFailにする想定）
         raise SystemExit(2)
@@ -0,0 +1,139 @@
+"""
+asyncio scheduler for run_generate --scheduler async.
+
+- recipe の各行ごとにプロデューサー（コルーチン）を立て、候補の生成（build_items：パラフレーズ込みで
+  CPU を食う部分）を executor に投げる。--workers > 1 なら ProcessPoolExecutor、それ以外はスレッド1本
+- 候補は有界の PriorityQueue に入る（満杯ならプロデューサーの put が待つ＝back-pressure）。
+  取り出し順は (-priority, 到着順) なので、priority の高い行の候補が先に判定される
+- コンシューマーは1つだけ：共有の 5-gram 索引で判定し、採用したら id を振って on_accept に渡す。
+  行ごとに quota に達するか、patience 回連続で不採用になったら（飽和）その行だけ止める
+  ＝飽和したトピックが他のトピックを待たせない
+
+候補列は (seed, 行番号, バッチ番号) から決まるが、採用順は各行の進み具合で変わるので
+出力はバイト単位では再現しない（--scheduler sequential が従来どおりの決定的な経路）。
+"""
+
+from __future__ import annotations
+import hashlib
+import itertools
+import random
+from typing import Callable, Dict, List
+
+from sdlg_edu import instrument as inst
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BATCH = 16
+DEFAULT_PATIENCE = 500
+
+def batch_seed(seed: int, spec_no: int, batch_no: int) -> int:
+    h = hashlib.sha256(f"{seed}:{spec_no}:{batch_no}".encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big")
+
+def _build_batch(task):
+    # executor 側：1バッチ分の候補を作る（id は仮。採用時にコンシューマーが振り直す）。
+    # build は run_generate.build_items（スクリプト実行時は __main__ 側のものを関数ごと渡す）
+    build, seed, topic, pattern, k = task
+    return build(random.Random(seed), 0, topic, pattern, k)
+
+class _SpecState:
+    __slots__ = ("spec", "quota", "priority", "got", "tried", "rejected", "streak", "status")
+
+    def __init__(self, spec: Dict, quota: int):
+        self.spec = spec
+        self.quota = quota
+        self.priority = int(spec.get("priority", 0))
+        self.got = self.tried = self.rejected = self.streak = 0
+        self.status = "running" if quota > 0 else "done"
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+async def _produce(loop, ex, queue, build, st: _SpecState, spec_no: int, seed: int, batch: int, seq):
+    batch_no = 0
+    try:
+        while st.running:
+            task = (build, batch_seed(seed, spec_no, batch_no), st.spec["topic"], st.spec["pattern"], batch)
+            batch_no += 1
+            items = await loop.run_in_executor(ex, _build_batch, task)
+            for item in items:
+                if not st.running:
+                    break
+                await queue.put((-st.priority, next(seq), spec_no, item))
+    finally:
+        # 終了の合図（同じ優先度で最後尾）
+        await queue.put((-st.priority, next(seq), spec_no, None))
+
+async def _consume(queue, states: List[_SpecState], seen_ngrams, on_accept: Callable, make_id: Callable,
+                   max_overlap_ratio: float, patience: int, idx: int):
+    stats = inst.STATS
+    live = len(states)
+    while live:
+        _, _, spec_no, item = await queue.get()
+        st = states[spec_no]
+        if item is None:
+            live -= 1
+            continue
+        if not st.running:
+            continue  # quota 到達・飽和後に届いた残り
+        st.tried += 1
+        blob = (item.get("question_en","") + " " + item.get("answer_en","")).strip()
+        with stats.timer("ngram_keys"):
+            grams = seen_ngrams.text_keys(blob, 5)
+        with stats.timer("overlap"):
+            rejected = grams and seen_ngrams.count_hits(grams) / len(grams) > max_overlap_ratio
+        if rejected:
+            stats.incr("rejected", topic=st.spec["topic"])
+            st.rejected += 1
+            st.streak += 1
+            if st.streak >= patience:
+                st.status = "stalled"
+            continue
+        stats.observe("trials", st.streak + 1)
+        st.streak = 0
+        seen_ngrams |= grams
+        item["id"] = make_id(idx)
+        idx += 1
+        st.got += 1
+        if st.got >= st.quota:
+            st.status = "done"
+        on_accept(item)
+    return idx
+
+async def _run(recipe, quotas, seen_ngrams, on_accept, build, make_id, seed, workers, init_worker,
+               queue_size, batch, patience, max_overlap_ratio, idx):
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    loop = asyncio.get_running_loop()
+    if workers > 1:
+        ex = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    else:
+        ex = ThreadPoolExecutor(max_workers=1)
+    queue = asyncio.PriorityQueue(maxsize=queue_size)
+    states = [_SpecState(spec, q) for spec, q in zip(recipe, quotas)]
+    seq = itertools.count()
+    try:
+        producers = [asyncio.ensure_future(_produce(loop, ex, queue, build, st, i, seed, batch, seq))
+                     for i, st in enumerate(states)]
+        idx = await _consume(queue, states, seen_ngrams, on_accept, make_id, max_overlap_ratio, patience, idx)
+        await asyncio.gather(*producers)
+    finally:
+        ex.shutdown(cancel_futures=True)
+    return states, idx
+
+def run_async(recipe: List[Dict], quotas: List[int], seen_ngrams, on_accept: Callable, build: Callable,
+              make_id: Callable, seed: int, workers: int = 1, init_worker: Callable = None,
+              queue_size: int = DEFAULT_QUEUE_SIZE, batch: int = DEFAULT_BATCH, patience: int = DEFAULT_PATIENCE,
+              max_overlap_ratio: float = 0.02, idx: int = 1) -> List[Dict]:
+    """
+    recipe[i] を quotas[i] 件まで並行に生成し、採用順に on_accept(item) を呼ぶ。
+    build(r, idx, topic, pattern, k) が候補を作り、init_worker() はワーカープロセスの初期化（パラフレーズ設定など）。
+    行ごとの結果（slot sampler の report と同じ形）を返す。
+    """
+    import asyncio  # asyncio / concurrent.futures は重いので --scheduler async のときだけ読み込む
+    states, _ = asyncio.run(_run(recipe, quotas, seen_ngrams, on_accept, build, make_id, seed, workers,
+                                 init_worker, queue_size, batch, patience, max_overlap_ratio, idx))
+    return [{"topic": st.spec["topic"], "pattern": st.spec["pattern"], "requested": st.quota, "got": st.got,
+             "space": None, "tried": st.tried, "rejected": st.rejected,
+             "status": "done" if st.got >= st.quota else st.status}
+            for st in states]
@@ -0,0 +1,173 @@
+"""
+Deterministic stratified spot-check sampler (docs/SPOT_CHECK_TEMPLATE.md のチェック表を作る).
+
+    python src/sdlg_edu/spot_check.py --input outputs/english_grammar_qa.jsonl --seed 42 --out reports/spot_check.md
+
+- JSONL を1回だけ先頭から読み、(topic, pattern, difficulty) の層ごとに容量 n の reservoir（Algorithm L）に入れる。
+  保持するのは層ごとに高々 n 件（チェック表に要る列だけ）なので、メモリはコーパスの行数によらない
+- 読み終えたら n 件を層の行数に比例して割り振る（最大剰余法。n が層の数以上なら各層に最低1件）。
+  各層の reservoir からさらに割り当て件数だけ非復元で引くので、層の中では一様な抽出になる
+- 乱数は層ごとに (seed, 層) から sha256 で導出する（run_generate のシャード / async のバッチと同じ流儀）。
+  同じ入力・seed・n なら常に同じ抽出になり、層の出現順にもよらない
+- 出力はテンプレートと同じ列のチェック表（判定欄は空）と、層ごとの行数・抽出数の表
+"""
+
+from __future__ import annotations
+import os, sys
+if not __package__:  # python src/sdlg_edu/spot_check.py として直接実行されたときだけ
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))  # src/sdlg_edu から見て親=src
+import argparse
+import hashlib
+import math
+import random
+from typing import Dict, List, Sequence, Tuple
+
+from sdlg_edu import fileio
+
+DEFAULT_N = 100
+DEFAULT_STRATA = ("topic", "pattern", "difficulty")
+# チェック表に載せる列（+ 層のキー）。reservoir にはこれだけを持つ
+TABLE_FIELDS = ("id", "topic", "question_en", "answer_en", "explanation_ja")
+TABLE_HEADER = (
+    "| No | id | Topic | Question (EN) | Answer (EN) | Explanation (JA) | 形式整合 | 文体 | 内容 | 重複 | 備考 |\n"
+    "|----|----|--------|----------------|--------------|------------------|-----------|------|------|------|------|"
+)
+
+def stratum_seed(seed: int, key: Tuple[str, ...]) -> int:
+    h = hashlib.sha256(f"{seed}:{chr(31).join(key)}".encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big")
+
+class Reservoir:
+    """
+    容量 k の一様 reservoir（Li の Algorithm L）。次に置き換える位置までの読み飛ばし数を幾何分布で引くので、
+    乱数を使うのは置き換えのときだけ（行数 N に対して O(k log(N/k)) 回）。
+    """
+
+    __slots__ = ("k", "items", "seen", "rng", "_w", "_next")
+
+    def __init__(self, k: int, rng: random.Random):
+        self.k = k
+        self.items: List = []
+        self.seen = 0
+        self.rng = rng
+        self._w = math.exp(math.log(self._u()) / k)
+        self._next = k + self._skip()
+
+    def _u(self) -> float:
+        return 1.0 - self.rng.random()  # (0, 1]
+
+    def _skip(self) -> int:
+        lw = math.log1p(-self._w) if self._w < 1.0 else -math.inf
+        return int(math.log(self._u()) / lw) + 1
+
+    def offer(self, item) -> None:
+        self.seen += 1
+        if self.seen <= self.k:
+            self.items.append(item)
+        elif self.seen == self._next:
+            self.items[self.rng.randrange(self.k)] = item
+            self._w *= math.exp(math.log(self._u()) / self.k)
+            self._next += self._skip()
+
+    def take(self, m: int) -> List:
+        """保持している中から m 件を非復元で引く（全体からの一様な m 件になる）。"""
+        return self.rng.sample(self.items, min(m, len(self.items)))
+
+def allocate(sizes: Dict[Tuple[str, ...], int], n: int) -> Dict[Tuple[str, ...], int]:
+    """層の行数に比例して n 件を割り振る（最大剰余法、層の行数が上限。n >= 層の数なら各層に最低1件）。"""
+    total = sum(sizes.values())
+    n = min(n, total)
+    if not n:
+        return {k: 0 for k in sizes}
+    floor_ = 1 if n >= len(sizes) else 0
+    share = {k: n * c / total for k, c in sizes.items()}
+    alloc = {k: min(c, max(floor_, int(share[k]))) for k, c in sizes.items()}
+    keys = sorted(sizes)
+    while sum(alloc.values()) < n:
+        k = max((k for k in keys if alloc[k] < sizes[k]), key=lambda k: share[k] - alloc[k])
+        alloc[k] += 1
+    while sum(alloc.values()) > n:
+        k = min((k for k in keys if alloc[k] > floor_), key=lambda k: share[k] - alloc[k])
+        alloc[k] -= 1
+    return alloc
+
+def draw(path: str, n: int = DEFAULT_N, seed: int = 42, strata: Sequence[str] = DEFAULT_STRATA):
+    """
+    path を1パスで読み、層別に n 件を引く。
+    (抽出したレコード（ファイル順、各要素は {"row", TABLE_FIELDS..., strata...}）, 層 → [行数, 抽出数]) を返す。
+    """
+    fields = list(dict.fromkeys([*TABLE_FIELDS, *strata]))
+    pos = [fields.index(f) for f in strata]
+    reservoirs: Dict[Tuple[str, ...], Reservoir] = {}
+    row = 0
+    for batch in fileio.iter_jsonl_batches(path, fields):
+        for values in batch:
+            key = tuple(str(values[i]) for i in pos)
+            res = reservoirs.get(key)
+            if res is None:
+                res = reservoirs[key] = Reservoir(n, random.Random(stratum_seed(seed, key)))
+            res.offer((row, values))
+            row += 1
+    alloc = allocate({k: r.seen for k, r in reservoirs.items()}, n)
+    picked = []
+    for key in sorted(reservoirs):
+        picked.extend(reservoirs[key].take(alloc[key]))
+    picked.sort(key=lambda rv: rv[0])
+    records = [{"row": r, **dict(zip(fields, values))} for r, values in picked]
+    summary = {k: [reservoirs[k].seen, alloc[k]] for k in sorted(reservoirs)}
+    return records, summary
+
+def _cell(v) -> str:
+    return str(v).replace("|", "\\|").replace("\r", "").replace("\n", "<br>")
+
+def write_markdown(path: str, records: List[Dict], summary: Dict, source: str, seed: int,
+                   strata: Sequence[str]) -> None:
+    rows = sum(c for c, _ in summary.values())
+    lines = [
+        "# 🧪 Spot check sample",
+        "",
+        f"> source: `{source}` ({rows} rows) / seed: {seed} / strata: {', '.join(strata)}",
+        "> 判定欄の記入方法・集計は docs/SPOT_CHECK_TEMPLATE.md を参照。",
+        "",
+        f"## 🧩 チェック表（{len(records)}件抜粋）",
+        "",
+        TABLE_HEADER,
+    ]
+    for no, rec in enumerate(records, 1):
+        cells = [f"{no:03d}", *(_cell(rec.get(f, "")) for f in TABLE_FIELDS), "", "", "", "", ""]
+        lines.append("| " + " | ".join(cells) + " |")
+    lines += [
+        "",
+        "## 層ごとの抽出数",
+        "",
+        "| " + " | ".join(strata) + " | rows | sampled |",
+        "|" + "----|" * (len(strata) + 2),
+    ]
+    for key, (count, taken) in summary.items():
+        lines.append("| " + " | ".join(_cell(v) for v in key) + f" | {count} | {taken} |")
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", required=True, help="Generated JSONL (.gz/.bz2/.xz ok)")
+    ap.add_argument("--out", default=os.path.join("reports", "spot_check.md"))
+    ap.add_argument("--n", type=int, default=DEFAULT_N, help="Sample size")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--strata", default=",".join(DEFAULT_STRATA), help="Comma-separated fields to stratify by")
+    a = ap.parse_args()
+    if a.n < 1:
+        ap.error("--n must be >= 1")
+    strata = [s for s in a.strata.split(",") if s]
+    if not strata:
+        ap.error("--strata needs at least one field")
+    records, summary = draw(a.input, a.n, a.seed, strata)
+    write_markdown(a.out, records, summary, a.input, a.seed, strata)
+    print(f"Sampled {len(records)} of {sum(c for c, _ in summary.values())} rows "
+          f"from {len(summary)} strata -> {a.out}")
+
+if __name__ == "__main__":
+    main()
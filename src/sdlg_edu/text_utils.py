@@ -1,15 +1,50 @@
 """
 Utility helpers for text normalization / template cleanup.
 This module intentionally keeps deps minimal and deterministic.
+
+- normalize_text / de_template_explanation は同じ入力に同じ出力を返す純関数なので、
+  結果を有界 LRU（MEMO_SIZE 件）に覚えておく。生成側の文字列は小さなプールの組み合わせで
+  何百万回も繰り返されるため、2回目以降は辞書引きだけになる。memo_stats() でヒット率を見られる
+- 全角記号・引用符の置換は事前に1本にまとめた置換表（恒等の項は除く）、文分割は事前コンパイル済みの正規表現。
+  str.translate は変換先が非 ASCII 混じりの表だと CPython では replace の連鎖より遅いので使わない
+- *_batch は文字列のリストをまとめて処理する
+- モジュールレベルの正規表現は lazy_compile で、最初に使われたときにコンパイルする（CLI の起動を軽くする）
 """
 
 from __future__ import annotations
+import functools
 import re
 import unicodedata
+from typing import Dict, List, Sequence
+
+class LazyPattern:
+    """
+    re.compile の遅延版。pattern / flags はコンパイルせずに読め、search / findall などのメソッドを
+    初めて引いたときにコンパイルして、そのバウンドメソッドをインスタンスに置く（2回目以降は属性引きだけ）。
+    """
+
+    def __init__(self, pattern, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = getattr(re.compile(self.pattern, self.flags), name)
+        setattr(self, name, value)
+        return value
+
+    def __reduce__(self):
+        return LazyPattern, (self.pattern, self.flags)
 
-_ws_re = re.compile(r"\s+")
-_tag_re = re.compile(r"[<\[{](.*?)[>\]}]")
-_tpl_re = re.compile(r"\{\{.*?\}\}|\(\(.*?\)\)")
+    def __repr__(self):
+        return f"LazyPattern({self.pattern!r})"
+
+def lazy_compile(pattern, flags: int = 0) -> LazyPattern:
+    return LazyPattern(pattern, flags)
+
+_tag_re = lazy_compile(r"[<\[{](.*?)[>\]}]")
+_tpl_re = lazy_compile(r"\{\{.*?\}\}|\(\(.*?\)\)")
 _quote_pairs = [
     ("“", '"'), ("”", '"'), ("„", '"'), ("‟", '"'),
     ("’", "'"), ("‘", "'"),
@@ -20,13 +55,44 @@ _punct_map = {
     "！": "!", "？": "?", "（": "(", "）": ")",
     "「": "「", "」": "」", "『": "『", "』": "』",
 }
+# 1文字→1文字で連鎖もしないので、_punct_map → _quote_pairs の順に全部 replace するのと同じ結果
+_unicode_table = tuple((k, v) for k, v in [*_punct_map.items(), *_quote_pairs] if k != v)
+# run_generate の normalize_text が従来から置き換えていた引用符だけ
+_text_table = (("’", "'"), ("“", '"'), ("”", '"'))
+_SENT_DELIMS = ("。", "！", "!", "？", "?")
+_sent_split_re = lazy_compile(r"(。|！|!|？|\?)")
+
+MEMO_SIZE = 1 << 16
+MEMO_MAX_LEN = 1024  # これより長い文字列は繰り返されにくいので覚えない
+
+def trie_pattern(words) -> str:
+    """
+    語の集合をトライに畳んだ正規表現（エスケープ済み）を作る（hate|hat → hat(?:e)?）。
+    各位置で試す分岐は次の文字の種類数までなので、語数が増えても走査コストはほぼ一定。
+    """
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def walk(node):
+        alts = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return walk(trie)
 
 def _normalize_unicode(s: str) -> str:
     # NFCで統一、よくある全角記号を半角へ（和文引用符は維持）
-    s = unicodedata.normalize("NFC", s)
-    for k, v in _punct_map.items():
-        s = s.replace(k, v)
-    for k, v in _quote_pairs:
+    if not unicodedata.is_normalized("NFC", s):
+        s = unicodedata.normalize("NFC", s)
+    for k, v in _unicode_table:
         s = s.replace(k, v)
     return s
 
@@ -37,22 +103,21 @@ def _cleanup_templates(s: str) -> str:
     return s
 
 def _squeeze_ws(s: str) -> str:
-    # 連続スペース・改行を1個に
-    s = _ws_re.sub(" ", s).strip()
-    return s
+    # 連続スペース・改行を1個に（str.split() の空白は \s と同じ定義）
+    return " ".join(s.split())
 
 def _clamp_ja_sentences(s: str, max_sentences: int = 3) -> str:
     """
     日本語説明を2〜3文に抑える簡易分割（。！？）で判定。
     """
     # 文区切りの目安：「。」「！」「？」＋改行など
-    parts = re.split(r"(。|！|!|？|\?)", s)
+    parts = _sent_split_re.split(s)
     # parts は [text, delim, text, delim, ...] 構造になることが多い
     out = []
     sentence = ""
     for chunk in parts:
         sentence += chunk
-        if chunk in ("。", "！", "!", "？", "?"):
+        if chunk in _SENT_DELIMS:
             out.append(sentence.strip())
             sentence = ""
         if len(out) >= max_sentences:
@@ -62,7 +127,7 @@ def _clamp_ja_sentences(s: str, max_sentences: int = 3) -> str:
         out.append(sentence.strip())
     # 末尾の句点体裁
     text = " ".join(out).strip()
-    if text and text[-1] not in ("。", "！", "!", "？", "?"):
+    if text and text[-1] not in _SENT_DELIMS:
         text += "。"
     return text
 
@@ -73,8 +138,54 @@ def de_template_explanation(s: str, max_sentences: int = 3) -> str:
     """
     if not isinstance(s, str):
         return s
+    if len(s) > MEMO_MAX_LEN:
+        return _de_template(s, max_sentences)
+    return _de_template_memo(s, max_sentences)
+
+def _de_template(s: str, max_sentences: int = 3) -> str:
     s = _normalize_unicode(s)
     s = _cleanup_templates(s)
     s = _squeeze_ws(s)
     s = _clamp_ja_sentences(s, max_sentences=max_sentences)
     return s
+
+def _normalize_text(s: str) -> str:
+    for k, v in _text_table:
+        s = s.replace(k, v)
+    return " ".join(s.split())
+
+def normalize_text(s: str) -> str:
+    """生成文の軽い正規化：曲がった引用符 ’ “ ” をまっすぐに、空白の連続を1個に、前後を strip。"""
+    if len(s) > MEMO_MAX_LEN:
+        return _normalize_text(s)
+    return _normalize_text_memo(s)
+
+def normalize_text_batch(strings: Sequence[str]) -> List[str]:
+    memo = _normalize_text_memo
+    return [memo(s) if len(s) <= MEMO_MAX_LEN else _normalize_text(s) for s in strings]
+
+def de_template_explanation_batch(strings: Sequence[str], max_sentences: int = 3) -> List:
+    return [de_template_explanation(s, max_sentences) for s in strings]
+
+# ---- memo ----
+
+def configure_memo(maxsize: int = MEMO_SIZE) -> None:
+    """memo の上限件数を変える（0 で無効）。覚えていた分は捨てる。"""
+    global _normalize_text_memo, _de_template_memo
+    _normalize_text_memo = functools.lru_cache(maxsize=maxsize)(_normalize_text)
+    _de_template_memo = functools.lru_cache(maxsize=maxsize)(_de_template)
+
+def clear_memo() -> None:
+    _normalize_text_memo.cache_clear()
+    _de_template_memo.cache_clear()
+
+def memo_stats() -> Dict[str, Dict]:
+    out = {}
+    for name, fn in (("normalize_text", _normalize_text_memo), ("de_template_explanation", _de_template_memo)):
+        info = fn.cache_info()
+        calls = info.hits + info.misses
+        out[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize,
+                     "hit_rate": round(info.hits / calls, 4) if calls else 0.0}
+    return out
+
+configure_memo()